@@ -1,22 +1,29 @@
 import copy
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, stream_with_context
 from flask_cors import CORS
 from flask_session import Session
 from utils.db_client import client
-from web3 import Web3
+from utils.markdown_cache import render_markdown, render_markdown_file
 import datetime
 import uuid
 import functools
-from assessment.calculation import dashboard_stats
-from core.fetch_user_tokens import get_tokens_held
-from core.generate_report import analyze_defi_project
+from assessment.calculation import dashboard_stats, dashboard_stats_many
+from core.dashboard_snapshots import latest_snapshots
+from core.health_score import WEIGHT_PROFILES, universe_index
+from core.holdings import get_holdings, held_token_symbol
+from core.generate_report import stream_defi_analysis
+from core.report_cache import cache_key, lookup_analysis, store_analysis
+from core.report_jobs import enqueue_report, get_job, store_report
 from core.optimise_portfolio import rebalance_portfolio
+from core.payment_verifier import consume_payment, release_payment, verify_payment
+from core.portfolio_valuation import value_portfolio
+from core.swap_executor import claim_swap_run, create_swap_run, get_swap_run, start_swap_run
+from core.user_activity import record_login
 from assessment.agent_choice import project_list, project_for_dashboard
 from openai import OpenAI
 from dotenv import load_dotenv
 import os
-import markdown2
 import urllib.parse
 from eth_account import Account
 
@@ -27,29 +34,26 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
-app.secret_key = os.getenv("SECRET_KEY")
-app.config["SESSION_TYPE"] = "filesystem"
-Session(app)
-
-
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 db = client["agentDatabase"]
-users = db["users_sonic"]
 
+# Sessions live in Mongo so any worker on any node can serve any user; expired ones are
+# removed by the TTL index Flask-Session creates on "expiration"
+app.secret_key = os.getenv("SECRET_KEY")
+app.config["SESSION_TYPE"] = "mongodb"
+app.config["SESSION_MONGODB"] = client
+app.config["SESSION_MONGODB_DB"] = db.name
+app.config["SESSION_MONGODB_COLLECT"] = "sessions"
+app.config["PERMANENT_SESSION_LIFETIME"] = datetime.timedelta(hours=int(os.getenv("SESSION_LIFETIME_HOURS", 24)))
+Session(app)
 
-# Sonic Network RPC URL
-SONIC_RPC_URL = "https://rpc.soniclabs.com"
-WEB3 = Web3(Web3.HTTPProvider(SONIC_RPC_URL))
+users = db["users_sonic"]
 
-# AUDIT Token Details
-AUDIT_TOKEN_COST = WEB3.to_wei(5, "ether")  # 1 AUDIT token required
-AUDIT_TOKEN_ADDRESS = "0x57223D89fE4c8C52023D06E7D30aD10cc441F84e"  # AUDIT Token Contract
-RECIPIENT_ADDRESS = "0x5A8eF3672fFAc8007ce2d025cebEbBAFb7F6e01B"  # Your recipient wallet
 
 # Register the custom markdown filter
 @app.template_filter('markdown')
 def markdown_filter(text):
-    return markdown2.markdown(text)
+    return render_markdown(text)
 
 # **Authentication Decorator**
 def login_required(f):
@@ -76,20 +80,7 @@ def store_wallet():
         return jsonify({"error": "Wallet address required"})
 
     session["wallet_address"] = wallet_address
-    user = users.find_one({"wallet_address": wallet_address})
-
-    if user:
-        users.update_one(
-            {"wallet_address": wallet_address},
-            {"$push": {"access_times": datetime.datetime.utcnow()}},
-        )
-    else:
-        users.insert_one({
-            "_id": str(uuid.uuid4().hex),
-            "wallet_address": wallet_address,
-            "created_at": datetime.datetime.utcnow(),
-            "access_times": [datetime.datetime.utcnow()]
-        })
+    record_login(wallet_address)
 
     return jsonify({"message": "Wallet address stored", "redirect": "/my-tokens"})
 
@@ -97,19 +88,37 @@ def store_wallet():
 @app.route("/")
 #@login_required
 def dashboard():
-    protocols_data = []
-    for name,symbol in project_for_dashboard.items():
-        protocol_stats = dashboard_stats(name,symbol)
-        protocols_data.append(protocol_stats)
+    # Serve the snapshots materialized by scripts/precompute_dashboard.py
+    stats = latest_snapshots(project_for_dashboard)
+    missing = {name: (name, symbol) for name, symbol in project_for_dashboard.items() if name not in stats}
+    if missing:
+        stats.update(dashboard_stats_many(missing))
+    protocols_data = [stats[name] for name in project_for_dashboard]
     return render_template("dashboard.html",protocols=protocols_data)
 
 
+@app.route("/top-projects")
+def top_projects():
+    """
+    Ranks the tracked projects by health score, e.g. /top-projects?k=20&min_score=70&profile=security.
+    Profiles that weigh TVL also rank the Sonic pool tokens without a snapshot.
+    """
+    profile = request.args.get("profile", "default")
+    if profile not in WEIGHT_PROFILES:
+        return jsonify({"error": f"Unknown profile. Choose one of: {', '.join(WEIGHT_PROFILES)}"}), 400
+    ranked = universe_index(profile).top(request.args.get("k", type=int), request.args.get("min_score", type=float))
+    return jsonify({"profile": profile, "projects": [
+        {"project": name, "symbol": symbol, "healthScore": round(score, 2)} for (name, symbol), score in ranked
+    ]})
+
+
 @app.route("/get-report/<project_name>", methods=["GET"])
 @login_required
 def get_report(project_name):
     try:
-       details = db.aiReports.find_one({"project":project_name})
-       ai_report = details.get("aiReport","Could not fetch report for this project")
+       details = db.aiReports.find_one({"project":project_name}, {"aiReport": 1, "aiReportHtml": 1})
+       # Reports are rendered when they are written; older ones are rendered once per process
+       ai_report = details.get("aiReportHtml") or render_markdown(details.get("aiReport","Could not fetch report for this project"))
     except Exception as e:
         return jsonify({"error": f"Failed to generate report: {str(e)}"})
     return render_template("report.html", project_name=project_name, report=ai_report)
@@ -122,31 +131,14 @@ def my_tokens():
     Fetches the user's tokens, retrieves their dashboard stats,
     and calculates the percentage of holdings in the portfolio.
     """
-    user_tokens = get_tokens_held("sonic", session["wallet_address"], os.getenv("SONIC_API_KEY"))
+    user_tokens = get_holdings("sonic", session["wallet_address"], os.getenv("SONIC_API_KEY"))
     if not user_tokens or isinstance(user_tokens, dict):
         return render_template("my-tokens.html", message="No tokens found or an error occurred.")
-    protocols_data = []
-    total_portfolio_value = 0
-    # Fetch all details from dashboard_stats in one loop
-    for token in user_tokens:
-        protocol_stats = dashboard_stats(token["name"], token["symbol"])
-        # Extract price and calculate token's value in USD
-        token_price = protocol_stats.get("tokenStats", {}).get("price_usd", 0)
-        token_value = token["balance"] * token_price if isinstance(token_price,(int,float)) else 0
-        # Store processed data
-        token["value_usd"] = round(token_value, 2) if isinstance(token_value,(int,float)) else 0
-        token["price_usd"] = round(token_price, 4) if isinstance(token_price,(int,float)) else 0
-        token["contract_address"] = token["contract_address"]
-        total_portfolio_value += token_value  # Update total holdings value
-        # Merge dashboard_stats data directly into token dictionary
-        token.update(protocol_stats)
-        protocols_data.append(token)
-    # Calculate percentage holdings
-    for token in protocols_data:
-        if total_portfolio_value > 0:
-            token["holding_percent"] = round((token["value_usd"] / total_portfolio_value) * 100, 2)
-        else:
-            token["holding_percent"] = 0
+    # Fetch all details from dashboard_stats concurrently
+    stats = dashboard_stats_many({i: (token["name"], token["symbol"]) for i, token in enumerate(user_tokens)})
+    portfolio = value_portfolio(user_tokens, [stats[i] for i in range(len(user_tokens))])
+    protocols_data = portfolio["tokens"]
+    total_portfolio_value = portfolio["total_value"]
     return render_template("my-tokens.html", protocols=protocols_data, total_value=round(total_portfolio_value, 2))
 
 
@@ -159,31 +151,25 @@ def analyze_token():
     if "wallet_address" not in session:
         return redirect(url_for("login"))
     combined_tokens = {name: symbol for name, symbol in project_list.items()}
-    user_tokens = get_tokens_held("sonic", session["wallet_address"], os.getenv("SONIC_API_KEY"))
+    user_tokens = get_holdings("sonic", session["wallet_address"], os.getenv("SONIC_API_KEY"))
     # Ensure `user_tokens` is iterable
     if isinstance(user_tokens, list) and len(user_tokens) > 0:
         for token in user_tokens:
             combined_tokens[token["name"]] = token["symbol"]
-    session["combined_tokens"] = combined_tokens
     reports = list(db.reports.find({"userId": session["wallet_address"]}, {"_id": 0}))
     return render_template("analyze-token.html", combined_tokens=combined_tokens, reports=reports)
 
 
-def validate_payment(tx_hash):
+def report_token_symbol(name):
     """
-    Validate if the transaction meets AUDIT token payment requirements.
-    """
-    try:
-        tx = WEB3.eth.get_transaction(tx_hash)
-        receipt = WEB3.eth.get_transaction_receipt(tx_hash)
-    except Exception as e:
-        return {"status": "failed", "reason": "Transaction not found."}
-
-    if not receipt or receipt["status"] != 1:
-        return {"status": "failed", "reason": "Transaction failed or not confirmed."}
+    Resolves the token a report is requested for: a tracked project, or a token the user holds.
+    The session only holds the wallet address, so any node can resolve it.
 
-    else:
-        return {"status": "success", "sender": tx["from"], "tx_hash": tx_hash}
+    :return: The token symbol, or None if the user cannot request a report for it.
+    """
+    if name in project_list:
+        return project_list[name]
+    return held_token_symbol("sonic", session["wallet_address"], name, os.getenv("SONIC_API_KEY"))
 
 
 @app.route("/process-payment", methods=["POST"])
@@ -196,9 +182,10 @@ def process_payment():
     tx_hash = data.get("txHash")
     if not tx_hash:
         return jsonify({"error": "Transaction hash required"}), 400
-    validation = validate_payment(tx_hash)
+    validation = verify_payment(tx_hash, session["wallet_address"])
     if validation["status"] == "success":
-        session["payment_verified"] = True
+        # The hash is spent by the report request that uses it
+        session["payment_verified"] = validation["tx_hash"]
         return jsonify({"success": True, "message": "Payment verified!"})
     else:
         return jsonify({"error": validation["reason"]}), 400
@@ -208,29 +195,93 @@ def process_payment():
 @login_required
 def generate_report(name):
     """
-    Generates a risk analysis report only if payment is confirmed.
+    Queues a risk analysis report only if payment is confirmed.
+    The report is generated by scripts/report_worker.py; poll /report-status/<job_id> for the result.
     """
     if not session.get("payment_verified"):
         return jsonify({"error": "Payment required before analysis."}), 403
     user_id = session.get("wallet_address", "unknown_user")
-    combined_list = session["combined_tokens"]
     encoded_name = urllib.parse.unquote(name)
-    data = dashboard_stats(encoded_name,combined_list[encoded_name])
-    ai_report = analyze_defi_project(data)["result"]
-    report_html = markdown2.markdown(ai_report)
-    # Generate report data
-    report_data = {
-        "_id":uuid.uuid4().hex,
-        "protocol": name,
-        "symbol":combined_list[encoded_name],
-        "reportContent": report_html,
-        "userId": user_id,
-        "createdAt": datetime.datetime.utcnow()
-    }
-    # Store in MongoDB
-    db.reports.insert_one(report_data)
-    session.pop("payment_verified", None)
-    return jsonify({"message": "Report generated successfully.", "report": report_data})
+    symbol = report_token_symbol(encoded_name)
+    if not symbol:
+        return jsonify({"error": "Unknown token."}), 404
+    payment_tx = session.pop("payment_verified")
+    if not consume_payment(payment_tx, user_id):
+        return jsonify({"error": "Payment has already been used."}), 403
+    job = enqueue_report(user_id, encoded_name, symbol, payment_tx)
+    return jsonify({"message": "Report generation queued.", "jobId": job["_id"]}), 202
+
+
+@app.route("/report-status/<job_id>", methods=["GET"])
+@login_required
+def report_status(job_id):
+    """Returns the status of a queued report, and the report itself once generated."""
+    status = get_job(job_id, session["wallet_address"])
+    if not status:
+        return jsonify({"error": "Report job not found."}), 404
+    return jsonify(status)
+
+def sse_event(event, payload):
+    """Formats one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+@app.route("/stream-report/<name>", methods=["GET"])
+@login_required
+def stream_report(name):
+    """
+    Streams a paid risk analysis report over Server-Sent Events as the model writes it.
+    Emits "status", then "chunk" events with markdown text, then "done" with the stored report
+    (or "error").
+    """
+    if not session.get("payment_verified"):
+        return jsonify({"error": "Payment required before analysis."}), 403
+    user_id = session.get("wallet_address", "unknown_user")
+    encoded_name = urllib.parse.unquote(name)
+    symbol = report_token_symbol(encoded_name)
+    if not symbol:
+        return jsonify({"error": "Unknown token."}), 404
+    # The session cannot be saved once the response body has started
+    payment_tx = session.pop("payment_verified")
+    if not consume_payment(payment_tx, user_id):
+        return jsonify({"error": "Payment has already been used."}), 403
+
+    def events():
+        delivered = False
+        try:
+            yield sse_event("status", {"message": "Collecting project data..."})
+            data = dashboard_stats(encoded_name, symbol)
+            key = cache_key(data)
+            entry = lookup_analysis(key)
+            if entry:
+                # An identical analysis is already stored; send it whole
+                yield sse_event("chunk", {"text": entry["markdown"]})
+                report_html = entry["html"]
+            else:
+                parts = []
+                for text in stream_defi_analysis(data, openai_client):
+                    parts.append(text)
+                    yield sse_event("chunk", {"text": text})
+                report_html = store_analysis(key, "".join(parts))
+
+            report_data = store_report(user_id, encoded_name, symbol, report_html)
+            delivered = True
+            yield sse_event("done", {"reportId": report_data["_id"], "reportContent": report_html})
+        except Exception as e:
+            yield sse_event("error", {
+                "error": f"Report generation failed: {str(e)}. Your payment was not used; verify the same transaction again to retry."
+            })
+        finally:
+            # Runs on errors and when the client disconnects mid-stream (GeneratorExit);
+            # a report that never reached db.reports must not cost the payment
+            if not delivered:
+                release_payment(payment_tx, user_id)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.route("/my-agent-flows")
 @login_required
@@ -241,7 +292,7 @@ def my_agent_flows():
         return redirect(url_for("login"))
 
     agent_flows = list(db.agent_flows.find({"user_id": user_id}, {"_id": 1, "target_security_score": 1, "top_n": 1, "created_at": 1}))
-    executed_swaps = list(db.executed_swaps.find({"user_id": user_id}, {"_id": 0}))
+    executed_swaps = list(db.executed_swaps.find({"user_id": user_id}))
 
     return render_template("my-agent-flows.html", agent_flows=agent_flows, executed_swaps=executed_swaps)
 
@@ -268,6 +319,45 @@ def set_agent_flow():
     db.agent_flows.insert_one(agent_flow)
     return jsonify({"message": "Agent flow saved successfully"})
 
+def portfolio_for_rebalance(user_id):
+    """
+    Fetches and values the user's current holdings for rebalancing.
+
+    :return: Tuple (valued tokens, None) or (None, error response).
+    """
+    # Fetch current token holdings
+    user_tokens = get_holdings("sonic", user_id, os.getenv("SONIC_API_KEY"))
+    if not user_tokens or isinstance(user_tokens, dict):
+        return None, (jsonify({"message": "No tokens found or an error occurred."}), 400)
+
+    # Rebalancing on partial data would misprice the portfolio, so every token must resolve
+    stats = dashboard_stats_many({i: (token["name"], token["symbol"]) for i, token in enumerate(user_tokens)})
+    if any(protocol_stats.get("timedOut") for protocol_stats in stats.values()):
+        return None, (jsonify({"message": "Timed out fetching token stats. Please try again."}), 503)
+
+    # Calculate portfolio distribution
+    return value_portfolio(user_tokens, [stats[i] for i in range(len(user_tokens))])["tokens"], None
+
+
+@app.route("/preview-agent-flow", methods=["POST"])
+@login_required
+def preview_agent_flow():
+    """Dry-run an agent flow: return the planned swaps without executing them."""
+    user_id = session.get("wallet_address")
+    flow_id = request.get_json().get("flow_id")
+    flow = db.agent_flows.find_one({"_id": flow_id, "user_id": user_id})
+    if not flow:
+        return jsonify({"message": "Agent flow not found"}), 404
+
+    protocols_data, error = portfolio_for_rebalance(user_id)
+    if error:
+        return error
+
+    plan = rebalance_portfolio(protocols_data, float(flow["target_security_score"]), None, int(flow["top_n"]), dry_run=True)
+    if plan["status"] != "success":
+        return jsonify({"message": plan["result"]}), 400
+    return jsonify({"message": f"{len(plan['swaps'])} swaps planned.", "plan": plan})
+
 import copy
 @app.route("/execute-agent-flow", methods=["POST"])
 @login_required
@@ -279,9 +369,10 @@ def execute_agent_flow():
 
     data = request.get_json()
     flow_id = data.get("flow_id")
+    run_id = data.get("run_id")
     private_key = data.get("private_key")
 
-    if not flow_id or not private_key:
+    if not (flow_id or run_id) or not private_key:
         return jsonify({"message": "Flow ID and private key are required"}), 400
 
     # Verify private key
@@ -292,62 +383,51 @@ def execute_agent_flow():
     except Exception:
         return jsonify({"message": f"Invalid private key"}), 403
 
-    # Fetch agent flow
-    flow = db.agent_flows.find_one({"_id": flow_id, "user_id": user_id})
-    if not flow:
-        return jsonify({"message": "Agent flow not found"}), 404
-
-    # Fetch current token holdings
-    user_tokens = get_tokens_held("sonic", user_id, os.getenv("SONIC_API_KEY"))
-    if not user_tokens or isinstance(user_tokens, dict):
-        return jsonify({"message": "No tokens found or an error occurred."}), 400
-
-    protocols_data = []
-    total_portfolio_value = 0
-
-    # Process tokens and calculate portfolio distribution
-    for token in user_tokens:
-        protocol_stats = dashboard_stats(token["name"], token["symbol"])
-        token_price = protocol_stats.get("tokenStats", {}).get("price_usd", 0)
-        token_value = token["balance"] * token_price
-
-        token["value_usd"] = round(token_value, 2)
-        token["price_usd"] = round(token_price, 4)
-        token["contract_address"] = token["contract_address"]
-        total_portfolio_value += token_value
-
-        token.update(protocol_stats)
-        protocols_data.append(token)
-
-    # Calculate percentage holdings
-    for token in protocols_data:
-        token["holding_percent"] = round((token["value_usd"] / total_portfolio_value) * 100, 2) if total_portfolio_value > 0 else 0
-
-    current_holdings = copy.deepcopy(protocols_data)
+    if run_id:
+        # Resume a partially executed run from its persisted swap statuses; the claim makes
+        # sure only one request resumes it
+        run = claim_swap_run(run_id, user_id)
+        if not run:
+            existing = db.executed_swaps.find_one({"_id": run_id, "user_id": user_id}, {"status": 1})
+            if not existing:
+                return jsonify({"message": "Swap run not found"}), 404
+            if existing["status"] == "completed":
+                return jsonify({"message": "All swaps in this run already succeeded."}), 400
+            if existing["status"] == "running":
+                return jsonify({"message": "This run is already in progress. It can be resumed if it makes no progress for a few minutes."}), 409
+            return jsonify({"message": "The remaining swaps may have been sent already. Check your wallet before running the flow again."}), 409
+    else:
+        # Fetch agent flow
+        flow = db.agent_flows.find_one({"_id": flow_id, "user_id": user_id})
+        if not flow:
+            return jsonify({"message": "Agent flow not found"}), 404
 
-    # Perform rebalancing
-    rebalanced_tokens = rebalance_portfolio(copy.deepcopy(current_holdings), float(flow["target_security_score"]), private_key, int(flow["top_n"]))
+        protocols_data, error = portfolio_for_rebalance(user_id)
+        if error:
+            return error
 
-    if not isinstance(rebalanced_tokens, list):
-        return jsonify({"message": rebalanced_tokens["result"]}), 400
+        # Plan rebalancing, then persist the plan so a partial run can resume
+        plan = rebalance_portfolio(protocols_data, float(flow["target_security_score"]), private_key, int(flow["top_n"]), dry_run=True)
+        if plan["status"] != "success":
+            return jsonify({"message": plan["result"]}), 400
+        if not plan["swaps"]:
+            return jsonify({"message": "No changes were made during rebalancing."}), 400
 
-    new_holdings = copy.deepcopy(rebalanced_tokens)
+        run = create_swap_run(user_id, flow_id, copy.deepcopy(protocols_data), plan)
 
-    # Check if rebalancing made any changes
-    if new_holdings == current_holdings:
-        return jsonify({"message": "No changes were made during rebalancing."}), 400
+    # Swaps run one at a time for up to SWAP_TIMEOUT each, so execute them off the request thread
+    start_swap_run(run, private_key)
+    return jsonify({"message": f"Executing {len(run['swaps'])} swaps.", "run_id": run["_id"]}), 202
 
-    # Store executed swap with correct original and new holdings
-    executed_swap = {
-        "_id": uuid.uuid4().hex,
-        "user_id": user_id,
-        "original_holdings": copy.deepcopy(current_holdings),
-        "new_holdings": new_holdings,
-        "executed_at": datetime.datetime.utcnow()
-    }
-    db.executed_swaps.insert_one(executed_swap)
 
-    return jsonify({"message": "Agent flow executed and swaps processed successfully.", "updated_holdings": new_holdings})
+@app.route("/swap-run-status/<run_id>", methods=["GET"])
+@login_required
+def swap_run_status(run_id):
+    """Returns the progress of a swap run, and the new holdings once every swap succeeded."""
+    status = get_swap_run(run_id, session["wallet_address"])
+    if not status:
+        return jsonify({"message": "Swap run not found"}), 404
+    return jsonify(status)
 
 @app.route("/log-out")
 @login_required
@@ -355,15 +435,9 @@ def log_out():
     session.clear()
     return redirect(url_for("dashboard"))
 
-# Function to read and convert Markdown to HTML using markdown2
-def get_markdown_content(filepath):
-    with open(filepath, "r", encoding="utf-8") as f:
-        content = f.read()
-    return markdown2.markdown(content)
-
 @app.route("/zerepy-docs")
 def zerepy_docs():
-    zerepy_content = get_markdown_content("zerepy_docs.md")
+    zerepy_content = render_markdown_file("zerepy_docs.md")
     return render_template("zerepy-docs.html",zerepy_content=zerepy_content)
 
 
@@ -1,6 +1,22 @@
 from core.fetch_token_stats import stats_by_symbol
 from core.fetch_security_stats import stats_by_project
+from core.fetch_tvl import symbol_metrics
+from core.health_score import health_score
+from utils.concurrency import fan_out, DEFAULT_DEADLINE
+import functools
 import json
+
+# Token stats used when market data is unavailable for a project
+NA_TOKEN_STATS = {
+    "price_usd": "NA",
+    "total_volume_24h": "NA",
+    "liquidity_ratio": "NA",
+    "liquidity_risk": "NA",
+    "buy_sell_ratio": "NA",
+    "market_sentiment": "NA",
+    "total_market_cap": "NA"
+}
+
 def dashboard_stats(project_name,symbol):
     """
     Fetches audit/security score, past hack records, and token metrics for a given project.
@@ -8,73 +24,29 @@ def dashboard_stats(project_name,symbol):
     :param project_name: The name of the project.
     :return: JSON containing all combined metrics for the specified project.
     """
+    # Fetch security and token stats in parallel
+    fetched = fan_out({
+        "security": functools.partial(stats_by_project, project_name),
+        "token": functools.partial(stats_by_symbol, symbol),
+        "tvl": functools.partial(symbol_metrics, symbol)
+    }, deadline=None)
+    for source in ("security", "token"):
+        if source in fetched["errors"]:
+            raise fetched["errors"][source]
+
     # Fetch audit/security score
-    security_stats = stats_by_project(project_name)
+    security_stats = fetched["results"]["security"]
     audit_security_score = security_stats["audit_data"]
 
     # Fetch hack history
     hack_data = security_stats["hacks_data"]
 
-    new_security_incident = 0
-
-    # Check if hack_data is a dictionary and contains the required keys
-    if isinstance(hack_data, dict) and "slowmist" in hack_data and "rekt_news" in hack_data:
-        slowmist_data = hack_data["slowmist"]
-        rekt_news_data = hack_data["rekt_news"]
-
-        # Function to check if "No hacks found" is present
-        def no_hacks_found(data):
-            if isinstance(data, dict):
-                return data.get("message", "").lower() == "no hacks found"
-            elif isinstance(data, list):
-                return all(
-                    isinstance(item, dict) and item.get("message", "").lower() == "no hacks found" for item in data)
-            return False
-
-        if no_hacks_found(slowmist_data) and no_hacks_found(rekt_news_data):
-            new_security_incident = 100
-
     # Fetch token stats
-    token_stats = stats_by_symbol(symbol)
+    token_stats = fetched["results"]["token"]
 
     # Handle missing token stats
     if "error" in token_stats:
-        token_stats = {
-            "price_usd": "NA",
-            "total_volume_24h": "NA",
-            "liquidity_ratio": "NA",
-            "liquidity_risk": "NA",
-            "buy_sell_ratio": "NA",
-            "market_sentiment": "NA",
-            "total_market_cap":"NA"
-        }
-
-    market_sentiment = token_stats.get("market_sentiment", 1)
-
-    if market_sentiment == "Bullish":
-        market_sentiment_score = 100  # Bullish
-    elif market_sentiment == "Neutral":
-        market_sentiment_score = 50  # Neutral
-    else:
-        market_sentiment_score = 0  # Bearish
-
-    # Fetch liquidity risk
-    liquidity_risk = token_stats.get("liquidity_risk", 0)
-
-    if liquidity_risk == "Low":
-        liquidity_score = 100
-    elif liquidity_risk == "Medium":
-        liquidity_score = 50
-    else:
-        liquidity_score = 0
-
-    # Compute Health Score
-    health_score = (
-            (0.3 * audit_security_score["total_score"]) +
-            (0.3 * market_sentiment_score) +
-            (0.2 * liquidity_score) +
-            (0.2 * 100)
-    )
+        token_stats = dict(NA_TOKEN_STATS)
 
     # Combine all data
     project_data = {
@@ -82,7 +54,51 @@ def dashboard_stats(project_name,symbol):
         "pastHacks": hack_data if hack_data else "NA",
         "symbol": symbol,
         "tokenStats": token_stats,
-        "healthScore":int(health_score)
+        # TVL metrics are optional enrichment, so a failed lookup only leaves them out
+        "tvlMetrics": fetched["results"].get("tvl") or "NA"
     }
+    project_data["healthScore"] = int(health_score(project_data))
+
+    return project_data
+
+
+def unavailable_stats(project_name, symbol):
+    """
+    Placeholder stats for a project whose data could not be fetched in time.
+
+    :param project_name: The name of the project.
+    :param symbol: The token symbol of the project.
+    :return: Dashboard stats shaped like dashboard_stats() output, flagged with "timedOut".
+    """
+    return {
+        "auditSecurityScore": {"project_name": project_name, "total_score": 0},
+        "pastHacks": "NA",
+        "symbol": symbol,
+        "tokenStats": dict(NA_TOKEN_STATS),
+        "healthScore": 0,
+        "timedOut": True
+    }
+
+
+def dashboard_stats_many(projects, deadline=DEFAULT_DEADLINE):
+    """
+    Fetches dashboard stats for many projects concurrently under one overall deadline.
+
+    :param projects: Dictionary of key -> (project_name, symbol).
+    :param deadline: Seconds to wait before returning partial results.
+    :return: Dictionary of key -> stats; projects that timed out or failed get unavailable_stats().
+    """
+    fetched = fan_out(
+        {key: functools.partial(dashboard_stats, name, symbol) for key, (name, symbol) in projects.items()},
+        deadline=deadline
+    )
 
-    return project_data
\ No newline at end of file
+    stats = {}
+    for key, (name, symbol) in projects.items():
+        if key in fetched["results"]:
+            stats[key] = fetched["results"][key]
+        else:
+            if key in fetched["errors"]:
+                print(f"Failed to fetch stats for {name}: {fetched['errors'][key]}")
+            stats[key] = unavailable_stats(name, symbol)
+    return stats
@@ -0,0 +1,78 @@
+import datetime
+import time
+import uuid
+import pymongo
+from utils.db_client import client
+
+db = client["agentDatabase"]
+collection = db["dashboardSnapshots"]
+
+# Snapshots older than this (seconds) are recomputed by the precompute worker
+SNAPSHOT_MAX_AGE = 300
+
+# Old snapshot versions are dropped by a TTL index after this many seconds
+SNAPSHOT_RETENTION = 7 * 24 * 3600
+
+
+def ensure_indexes():
+    """Creates the indexes the snapshot reads and the retention policy rely on."""
+    collection.create_index([("project", pymongo.ASCENDING), ("version", pymongo.DESCENDING)])
+    # Serves the newest-version lookup that tells readers whether any snapshot changed
+    collection.create_index([("version", pymongo.DESCENDING)])
+    collection.create_index("createdAt", expireAfterSeconds=SNAPSHOT_RETENTION)
+
+
+def write_snapshot(project_name, stats):
+    """
+    Stores a new version of a project's dashboard stats.
+
+    :param project_name: The name of the project.
+    :param stats: Output of dashboard_stats() for the project.
+    :return: The inserted snapshot document.
+    """
+    snapshot = {
+        "_id": uuid.uuid4().hex,
+        "project": project_name,
+        "version": time.time_ns(),
+        "createdAt": datetime.datetime.utcnow(),
+        "symbol": stats.get("symbol"),
+        "healthScore": stats.get("healthScore"),
+        "auditSecurityScore": stats.get("auditSecurityScore"),
+        "pastHacks": stats.get("pastHacks"),
+        "tokenStats": stats.get("tokenStats"),
+        "tvlMetrics": stats.get("tvlMetrics")
+    }
+    collection.insert_one(snapshot)
+    return snapshot
+
+
+def latest_snapshots(project_names=None):
+    """
+    Fetches the latest snapshot of each project in one indexed query.
+
+    :param project_names: Iterable of project names, or None for every project with a snapshot.
+    :return: Dictionary of project name -> latest snapshot document.
+    """
+    pipeline = [
+        {"$sort": {"project": 1, "version": -1}},
+        {"$group": {"_id": "$project", "snapshot": {"$first": "$$ROOT"}}}
+    ]
+    if project_names is not None:
+        pipeline.insert(0, {"$match": {"project": {"$in": list(project_names)}}})
+    return {doc["_id"]: doc["snapshot"] for doc in collection.aggregate(pipeline)}
+
+
+def stale_projects(projects, max_age=SNAPSHOT_MAX_AGE):
+    """
+    Selects the projects whose latest snapshot is missing or older than max_age.
+
+    :param projects: Dictionary of project name -> symbol.
+    :param max_age: Maximum snapshot age in seconds.
+    :return: Dictionary of project name -> symbol for the stale entries.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=max_age)
+    snapshots = latest_snapshots(projects)
+    return {
+        name: symbol for name, symbol in projects.items()
+        if name not in snapshots or snapshots[name]["createdAt"] < cutoff
+    }
@@ -1,6 +1,9 @@
+import datetime
 import requests
 import os
 from dotenv import load_dotenv
+from pymongo import ReturnDocument
+from utils.db_client import client
 
 load_dotenv()
 
@@ -8,6 +11,16 @@ CMC_API_KEY = os.getenv("CMC_API")
 CMC_QUOTE_URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
 CMC_INFO_URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/info"
 
+# Monthly credit allowance of our CoinMarketCap plan
+CMC_MONTHLY_CREDITS = int(os.getenv("CMC_MONTHLY_CREDITS", 10000))
+
+# Project metadata (urls, description, launch date) barely changes, so cache it for days
+INFO_CACHE_TTL = 3 * 24 * 3600
+
+db = client["agentDatabase"]
+info_cache = db["cmcInfoCache"]
+credit_usage = db["cmcCreditUsage"]
+
 def safe_get(data, key):
     """Safely fetch a key from a dictionary, handling empty lists and missing keys."""
     value = data.get(key, [])
@@ -17,45 +30,74 @@ def safe_get(data, key):
         return value
     return "N/A"  # Default return for missing or empty values
 
-def fetch_single_token_data(symbol):
+def ensure_indexes():
+    """Creates the TTL index that expires cached project metadata."""
+    info_cache.create_index("fetchedAt", expireAfterSeconds=INFO_CACHE_TTL)
+
+
+def record_credits(response_data):
     """
-    Fetches details for a single token from CoinMarketCap.
-    :param symbol: Token symbol (e.g., 'ETH', 'BTC')
-    :return: Dictionary with token details
+    Adds the credits a CoinMarketCap response consumed to this month's usage.
+
+    :return: Credits used so far this month.
     """
-    if not CMC_API_KEY:
-        return {"error": "Missing CoinMarketCap API key"}
+    credits = response_data.get("status", {}).get("credit_count", 0)
+    month = datetime.datetime.utcnow().strftime("%Y-%m")
+    usage = credit_usage.find_one_and_update(
+        {"_id": month},
+        {"$inc": {"credits": credits, "calls": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    if usage["credits"] > 0.9 * CMC_MONTHLY_CREDITS:
+        print(f"CoinMarketCap credit usage at {usage['credits']} of {CMC_MONTHLY_CREDITS} for {month}")
+    return usage["credits"]
+
 
+def cmc_get(url, symbols):
+    """
+    Requests one CoinMarketCap endpoint for a batch of symbols, recording credit usage.
+
+    :return: The response's "data" mapping of symbol -> entry.
+    """
     headers = {
         "Accepts": "application/json",
         "X-CMC_PRO_API_KEY": CMC_API_KEY,
     }
+    response = requests.get(url, headers=headers, params={"symbol": ",".join(symbols), "skip_invalid": "true"})
+    response_data = response.json()
+    record_credits(response_data)
+    if "data" not in response_data:
+        raise ValueError(response_data.get("status", {}).get("error_message", "Invalid response"))
+    return response_data["data"]
 
-    # Fetch project details
-    try:
-        info_response = requests.get(CMC_INFO_URL, headers=headers, params={"symbol": symbol})
-        info_data = info_response.json()
-        if "data" not in info_data:
-            return {"error": "Invalid response from CoinMarketCap Info API"}
-    except Exception as e:
-        return {"error": f"Failed to fetch CoinMarketCap project info: {e}"}
 
-    # Fetch price in USD
-    try:
-        quote_response = requests.get(CMC_QUOTE_URL, headers=headers, params={"symbol": symbol})
-        quote_data = quote_response.json()
-        if "data" not in quote_data:
-            return {"error": "Invalid response from CoinMarketCap Quote API"}
-    except Exception as e:
-        return {"error": f"Failed to fetch CoinMarketCap price data: {e}"}
+def fetch_token_info(symbols):
+    """
+    Fetches project metadata for many symbols, serving cached entries and requesting
+    only the missing ones in one batched call.
+
+    :return: Dictionary of symbol -> CoinMarketCap info entry.
+    """
+    infos = {doc["_id"]: doc["data"] for doc in info_cache.find({"_id": {"$in": symbols}})}
+    missing = [symbol for symbol in symbols if symbol not in infos]
+    if missing:
+        fetched = cmc_get(CMC_INFO_URL, missing)
+        now = datetime.datetime.utcnow()
+        for symbol, data in fetched.items():
+            infos[symbol] = data
+            info_cache.replace_one({"_id": symbol}, {"_id": symbol, "data": data, "fetchedAt": now}, upsert=True)
+    return infos
 
+
+def build_token_data(quote, crypto_data):
+    """Shapes one symbol's quote and info entries into the token details returned to callers."""
     token_data = {}
 
-    if symbol in quote_data["data"]:
-        token_data["price_usd"] = quote_data["data"][symbol]["quote"]["USD"]["price"]
+    if quote:
+        token_data["price_usd"] = quote["quote"]["USD"]["price"]
 
-    if symbol in info_data["data"]:
-        crypto_data = info_data["data"][symbol]
+    if crypto_data:
         token_data.update({
             "name": crypto_data.get("name"),
             "symbol": crypto_data.get("symbol"),
@@ -87,3 +129,42 @@ def fetch_single_token_data(symbol):
 
     return token_data
 
+
+def fetch_tokens_data(symbols):
+    """
+    Fetches details for many tokens from CoinMarketCap: quotes in one batched call,
+    project info from the long-lived cache.
+
+    :param symbols: List of token symbols (e.g. ['ETH', 'BTC']).
+    :return: Dictionary of symbol -> token details, or an error dict.
+    """
+    if not CMC_API_KEY:
+        return {"error": "Missing CoinMarketCap API key"}
+
+    symbols = sorted({symbol.upper() for symbol in symbols})
+
+    # Fetch project details
+    try:
+        info_data = fetch_token_info(symbols)
+    except Exception as e:
+        return {"error": f"Failed to fetch CoinMarketCap project info: {e}"}
+
+    # Fetch price in USD
+    try:
+        quote_data = cmc_get(CMC_QUOTE_URL, symbols)
+    except Exception as e:
+        return {"error": f"Failed to fetch CoinMarketCap price data: {e}"}
+
+    return {symbol: build_token_data(quote_data.get(symbol), info_data.get(symbol)) for symbol in symbols}
+
+
+def fetch_single_token_data(symbol):
+    """
+    Fetches details for a single token from CoinMarketCap.
+    :param symbol: Token symbol (e.g., 'ETH', 'BTC')
+    :return: Dictionary with token details
+    """
+    tokens_data = fetch_tokens_data([symbol])
+    if "error" in tokens_data:
+        return tokens_data
+    return tokens_data.get(symbol.upper(), {})
@@ -0,0 +1,136 @@
+from web3 import Web3
+from utils.web3_client import WEB3
+from core.fetch_user_tokens import format_holdings
+
+# Multicall3 is deployed at the same address on Sonic and most EVM chains
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+MULTICALL3_ABI = [{
+    "name": "aggregate3",
+    "type": "function",
+    "stateMutability": "payable",
+    "inputs": [{
+        "name": "calls",
+        "type": "tuple[]",
+        "components": [
+            {"name": "target", "type": "address"},
+            {"name": "allowFailure", "type": "bool"},
+            {"name": "callData", "type": "bytes"}
+        ]
+    }],
+    "outputs": [{
+        "name": "returnData",
+        "type": "tuple[]",
+        "components": [
+            {"name": "success", "type": "bool"},
+            {"name": "returnData", "type": "bytes"}
+        ]
+    }]
+}]
+
+BALANCE_OF_SELECTOR = Web3.keccak(text="balanceOf(address)")[:4]
+DECIMALS_SELECTOR = Web3.keccak(text="decimals()")[:4]
+
+
+def decode_uint(web3, success, data):
+    """Decodes a uint256 return value, or None if the call failed or returned nothing."""
+    if not success or len(data) < 32:
+        return None
+    return web3.codec.decode(["uint256"], data)[0]
+
+
+def aggregate_calls(web3, calls, multicall_address):
+    """
+    Executes read-only calls in a single eth_call through Multicall3.
+
+    :param calls: List of (target address, calldata bytes).
+    :return: List of (success, return data) in call order.
+    """
+    multicall = web3.eth.contract(address=Web3.to_checksum_address(multicall_address), abi=MULTICALL3_ABI)
+    results = multicall.functions.aggregate3([(target, True, data) for target, data in calls]).call()
+    return [(success, bytes(data)) for success, data in results]
+
+
+def batch_calls(web3, calls):
+    """
+    Executes read-only calls as one JSON-RPC batch, for chains without Multicall3.
+
+    :param calls: List of (target address, calldata bytes).
+    :return: List of (success, return data) in call order.
+    """
+    with web3.batch_requests() as batch:
+        for target, data in calls:
+            batch.add(web3.eth.call({"to": target, "data": data}))
+        responses = batch.execute()
+    return [(True, bytes(response)) for response in responses]
+
+
+def sequential_calls(web3, calls):
+    """
+    Executes read-only calls one by one, tolerating individual reverts.
+
+    :param calls: List of (target address, calldata bytes).
+    :return: List of (success, return data) in call order.
+    """
+    results = []
+    for target, data in calls:
+        try:
+            results.append((True, bytes(web3.eth.call({"to": target, "data": data}))))
+        except Exception:
+            results.append((False, b""))
+    return results
+
+
+def get_onchain_balances(wallet_address, tokens, web3=WEB3, multicall_address=MULTICALL3_ADDRESS):
+    """
+    Reads balanceOf and decimals for every candidate token in one aggregated round trip.
+
+    :param wallet_address: The wallet address to check.
+    :param tokens: Candidate tokens, each with contract_address, name and symbol.
+    :param web3: Web3 instance to query (a local EVM stand-in in tests).
+    :param multicall_address: Multicall3 address; None forces the JSON-RPC batch path.
+    :return: A list of token balances, in the same shape as get_tokens_held().
+    """
+    if not tokens:
+        return []
+
+    owner = Web3.to_checksum_address(wallet_address)
+    balance_calldata = BALANCE_OF_SELECTOR + web3.codec.encode(["address"], [owner])
+
+    calls = []
+    for token in tokens:
+        target = Web3.to_checksum_address(token["contract_address"])
+        calls.append((target, balance_calldata))
+        calls.append((target, DECIMALS_SELECTOR))
+
+    results = None
+    if multicall_address:
+        try:
+            results = aggregate_calls(web3, calls, multicall_address)
+        except Exception as e:
+            print(f"Multicall unavailable, falling back to JSON-RPC batch: {e}")
+    if results is None:
+        try:
+            results = batch_calls(web3, calls)
+        except Exception as e:
+            # A single reverting call fails the whole batch
+            print(f"JSON-RPC batch failed, reading balances one by one: {e}")
+            results = sequential_calls(web3, calls)
+
+    balances = {}
+    for i, token in enumerate(tokens):
+        raw_balance = decode_uint(web3, *results[2 * i])
+        decimals = decode_uint(web3, *results[2 * i + 1])
+        # Skip contracts that do not behave like ERC-20 tokens
+        if raw_balance is None or decimals is None:
+            continue
+        contract = token["contract_address"].lower()
+        balances[contract] = {
+            "name": token["name"],
+            "symbol": token["symbol"],
+            "contract_address": contract,
+            "decimals": decimals,
+            "raw_balance": raw_balance
+        }
+
+    return format_holdings(balances)
@@ -1,38 +1,18 @@
-import requests
+from core.zerepy_client import call_action
+from utils.cache import ttl_cache
 
-def load_agent():
-    """Ensures the agent is loaded before fetching token stats."""
-    url = "https://zerepy.auditone.io/agents/auditone-sonic/load"
-    headers = {
-        "accept": "application/json"
-    }
-
-    response = requests.post(url, headers=headers)
-
-    if response.status_code == 200:
-        return True  # Agent loaded successfully
-    else:
-        return False  # Failed to load agent
+# Security and hack data changes a few times a day at most
+SECURITY_STATS_TTL = 3600
+SECURITY_STATS_MAX_STALE = 86400
+ERROR_TTL = 15
 
+@ttl_cache(ttl=SECURITY_STATS_TTL, negative_ttl=ERROR_TTL, max_stale=SECURITY_STATS_MAX_STALE)
 def stats_by_project(project_name):
     """Fetches token stats after ensuring the agent is loaded."""
-    if not load_agent():
+    response = call_action("sonic", "get-security-stats", [project_name])
+    if response is None:
         return {"error": "Failed to load agent", "default_used": True}
 
-    url = "https://zerepy.auditone.io/agent/action"
-    headers = {
-        "accept": "application/json",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "connection": "sonic",
-        "action": "get-security-stats",
-        "params": [project_name]
-    }
-
-    response = requests.post(url, headers=headers, json=data)
-
-
     if response.status_code == 200:
         result = response.json()
 
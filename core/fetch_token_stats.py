@@ -1,40 +1,18 @@
-import requests
+from core.zerepy_client import call_action
+from utils.cache import ttl_cache
 
-def load_agent():
-    """Ensures the agent is loaded before fetching token stats."""
-    url = "https://zerepy.auditone.io/agents/auditone-sonic/load"
-    headers = {
-        "accept": "application/json"
-    }
-
-    response = requests.post(url, headers=headers)
-
-    if response.status_code == 200:
-        return True  # Agent loaded successfully
-    else:
-        print(f"Error loading agent: {response.status_code}")
-        return False  # Failed to load agent
+# Market data is acceptable up to a minute old; entries long past expiry reload before serving
+TOKEN_STATS_TTL = 30
+TOKEN_STATS_MAX_STALE = 120
+ERROR_TTL = 10
 
+@ttl_cache(ttl=TOKEN_STATS_TTL, negative_ttl=ERROR_TTL, max_stale=TOKEN_STATS_MAX_STALE)
 def stats_by_symbol(symbol):
     """Fetches token stats after ensuring the agent is loaded."""
-    if not load_agent():
+    response = call_action("sonic", "get-token-stats", [symbol])
+    if response is None:
         return {"error": "Failed to load agent", "default_used": True}
 
-    url = "https://zerepy.auditone.io/agent/action"
-    headers = {
-        "accept": "application/json",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "connection": "sonic",
-        "action": "get-token-stats",
-        "params": [symbol]
-    }
-
-    response = requests.post(url, headers=headers, json=data)
-
-    print(response)
-
     if response.status_code == 200:
         result = response.json()
 
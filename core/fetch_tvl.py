@@ -0,0 +1,89 @@
+from utils.db_client import client
+import datetime
+import json
+import re
+
+db = client["agentDatabase"]
+collection = db["tvlSonicProjects"]
+metrics_collection = db["tvlSymbolMetrics"]
+
+
+def normalize_symbols(pool_symbol):
+    """
+    Splits a pool symbol such as 'wS-USDC.e' into its upper-cased token symbols.
+
+    :return: Sorted list of unique token symbols.
+    """
+    return sorted({part.upper() for part in re.split(r"[-/\s]+", pool_symbol or "") if part})
+
+
+def ensure_indexes():
+    """Creates the index the per-symbol aggregation matches on."""
+    collection.create_index("symbols")
+
+
+def refresh_symbol_metrics():
+    """
+    Recomputes the per-symbol TVL metrics materialized view from the ingested pools.
+    Run after every ingestion.
+    """
+    refreshed_at = datetime.datetime.utcnow()
+    pipeline = [
+        {"$match": {"symbols.0": {"$exists": True}}},
+        {"$unwind": "$symbols"},
+        {"$group": {
+            "_id": "$symbols",
+            "totalTvl": {"$sum": {"$ifNull": ["$tvlUsd", 0]}},
+            "avgApy": {"$avg": {"$ifNull": ["$apyBase", 0]}},
+            "avgSigma": {"$avg": {"$ifNull": ["$sigma", 0]}},
+            "impermanentLossRisk": {"$avg": {"$cond": [{"$eq": ["$ilRisk", "yes"]}, 1, 0]}},
+            "predictedProbability": {"$avg": {"$ifNull": ["$predictions.predictedProbability", 50]}},
+            "totalVolume1d": {"$sum": {"$ifNull": ["$volumeUsd1d", 0]}},
+            "totalVolume7d": {"$sum": {"$ifNull": ["$volumeUsd7d", 0]}},
+            "numPools": {"$sum": 1}
+        }},
+        {"$set": {"refreshedAt": refreshed_at}},
+        {"$merge": {"into": metrics_collection.name, "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+    collection.aggregate(pipeline)
+
+    # Symbols with no pools left were not part of this refresh
+    metrics_collection.delete_many({"refreshedAt": {"$lt": refreshed_at}})
+
+
+def symbol_metrics(symbol):
+    """
+    Fetches the materialized TVL metrics for a token symbol.
+
+    :param symbol: The symbol of the token to assess.
+    :return: Dictionary of metrics, or None if no pool contains the symbol.
+    """
+    metrics = metrics_collection.find_one({"_id": symbol.upper()})
+    if not metrics:
+        return None
+
+    return {
+        "symbol": symbol,
+        "totalTvl": metrics["totalTvl"],
+        "avgApy": round(metrics["avgApy"], 2),
+        "avgSigma": round(metrics["avgSigma"], 4),
+        "impermanentLossRisk": round(metrics["impermanentLossRisk"], 2),  # % of pools with IL risk
+        "predictedProbability": round(metrics["predictedProbability"], 2),
+        "totalVolume1d": metrics["totalVolume1d"],
+        "totalVolume7d": metrics["totalVolume7d"],
+        "numPools": metrics["numPools"]
+    }
+
+
+def get_symbol_metrics(symbol):
+    """
+    Fetches all available metrics for a given symbol from MongoDB.
+
+    :param symbol: The symbol of the token to assess.
+    :return: JSON containing all combined metrics for the given symbol.
+    """
+    output = symbol_metrics(symbol)
+    if output is None:
+        return json.dumps({"error": f"No data found for symbol {symbol}"}, indent=4)
+
+    return json.dumps(output, indent=4)
@@ -1,6 +1,10 @@
 import requests
 import os
+import random
+import threading
+import time
 from dotenv import load_dotenv
+from utils.concurrency import SingleFlight
 
 load_dotenv()
 
@@ -18,61 +22,234 @@ SPAM_TOKENS = [
 # Minimum balance threshold to filter small airdrops (set to 0.01 as default)
 MIN_BALANCE_THRESHOLD = 0.01
 
-def get_tokens_held(chain, wallet_address, api_key):
+# Coalesces identical in-flight explorer requests across request threads
+explorer_flights = SingleFlight()
+
+# Timeout (seconds) for a single explorer request
+EXPLORER_TIMEOUT = 30
+
+# Rows per tokentx page, and the most rows the explorer serves for one query across pages
+TOKENTX_PAGE_SIZE = 1000
+EXPLORER_RESULT_WINDOW = 10000
+
+# The explorer's free tier allows 5 calls per second per key; requests are spaced accordingly
+EXPLORER_MIN_INTERVAL = 0.2
+
+# Retries of a rate-limited request, with exponential backoff from EXPLORER_BACKOFF_BASE seconds
+EXPLORER_MAX_RETRIES = 4
+EXPLORER_BACKOFF_BASE = 1
+
+pacing_lock = threading.Lock()
+next_request_at = 0.0
+
+
+class ExplorerError(Exception):
+    """Raised when the blockchain explorer returns an error response."""
+
+
+def explorer_get(chain, params, api_key):
     """
-    Fetches only the actual ERC-20 tokens held by a wallet on Sonic,
-    excluding transactions and ensuring accurate balances.
+    Sends one request to the chain's explorer API, sharing it with identical in-flight requests.
 
     :param chain: The blockchain to query ('sonic').
-    :param wallet_address: The wallet address to check.
+    :param params: Explorer query parameters (module, action, ...).
     :param api_key: The API key for the blockchain explorer.
-    :return: A list of token balances the user actually holds.
+    :return: The decoded JSON response.
     """
     if chain not in CHAIN_API_BASE_URLS:
-        return {"error": "Unsupported chain"}
+        raise ExplorerError("Unsupported chain")
 
-    api_url = f"{CHAIN_API_BASE_URLS[chain]}?module=account&action=tokentx&address={wallet_address}&sort=desc&apikey={api_key}"
+    query = dict(params, apikey=api_key)
+    key = (chain,) + tuple(sorted((k, str(v)) for k, v in query.items()))
 
-    response = requests.get(api_url)
+    for attempt in range(EXPLORER_MAX_RETRIES + 1):
+        response = explorer_flights.do(key, lambda: paced_get(CHAIN_API_BASE_URLS[chain], query))
+        data = response.json() if response.status_code == 200 else None
+        if not is_rate_limited(response.status_code, data):
+            break
+        if attempt == EXPLORER_MAX_RETRIES:
+            raise ExplorerError("Explorer rate limit reached, retries exhausted")
+        time.sleep(EXPLORER_BACKOFF_BASE * 2 ** attempt * (1 + random.random()))
 
     if response.status_code != 200:
-        return {"error": f"Failed to fetch data, HTTP Status: {response.status_code}"}
+        raise ExplorerError(f"Failed to fetch data, HTTP Status: {response.status_code}")
+
+    return data
+
+
+def paced_get(url, query):
+    """Sends a GET request, waiting first so requests leave at most one per EXPLORER_MIN_INTERVAL."""
+    global next_request_at
+    with pacing_lock:
+        now = time.monotonic()
+        wait = next_request_at - now
+        next_request_at = max(now, next_request_at) + EXPLORER_MIN_INTERVAL
+    if wait > 0:
+        time.sleep(wait)
+    return requests.get(url, params=query, timeout=EXPLORER_TIMEOUT)
 
-    data = response.json()
+
+def is_rate_limited(status_code, data):
+    """
+    Checks for a rate-limit response: HTTP 429, or status "0" with a message such as
+    "Max rate limit reached" or "Max calls per sec rate limit reached (5/sec)".
+    """
+    if status_code == 429:
+        return True
+    if not isinstance(data, dict) or data.get("status") != "0":
+        return False
+    return "rate limit" in f"{data.get('message', '')} {data.get('result', '')}".lower()
+
+
+def fetch_token_transfer_page(chain, wallet_address, api_key, start_block, page):
+    """
+    Fetches one page of a wallet's ERC-20 transfers from start_block onwards, oldest first.
+
+    :return: List of explorer tokentx rows (empty once past the last page).
+    """
+    data = explorer_get(chain, {
+        "module": "account",
+        "action": "tokentx",
+        "address": wallet_address,
+        "startblock": start_block,
+        "page": page,
+        "offset": TOKENTX_PAGE_SIZE,
+        "sort": "asc"
+    }, api_key)
 
     if data.get("status") != "1":
-        return {"error": data.get("message", "Unknown error")}
+        if "no transactions found" in str(data.get("message", "")).lower():
+            return []
+        raise ExplorerError(data.get("message", "Unknown error"))
 
-    tokens = {}
+    return data["result"]
 
-    for tx in data["result"]:
-        sender = tx["from"].lower()
-        receiver = tx["to"].lower()
-        token_contract = tx["contractAddress"].lower()
-        token_name = tx["tokenName"]
-        token_symbol = tx["tokenSymbol"]
-        value = int(tx["value"]) / (10 ** int(tx["tokenDecimal"]))
-
-        # **Ignore spam tokens**
-        if token_contract.lower() in SPAM_TOKENS:
-            continue
-
-        # **Initialize token if not already in dictionary**
-        if token_contract not in tokens:
-            tokens[token_contract] = {
-                "name": token_name,
-                "symbol": token_symbol,
-                "contract_address": token_contract,
-                "balance": 0
-            }
-
-        # **Add balance if received, subtract if sent**
-        if receiver == wallet_address.lower():
-            tokens[token_contract]["balance"] += value
-        elif sender == wallet_address.lower():
-            tokens[token_contract]["balance"] -= value
-
-    # **Filter out tokens with zero or negative balance**
-    filtered_tokens = [token for token in tokens.values() if token["balance"] > MIN_BALANCE_THRESHOLD]
-
-    return filtered_tokens
+
+def transfer_key(tx):
+    """Identifies a transfer row, so rows re-read at a window boundary are not applied twice."""
+    return tx["hash"], tx.get("logIndex"), tx["contractAddress"], tx["from"], tx["to"], tx["value"]
+
+
+def iter_token_transfers(chain, wallet_address, api_key, start_block=0):
+    """
+    Streams a wallet's ERC-20 transfers page by page, oldest first, so callers can fold each
+    page as it arrives and memory stays bounded by the page size.
+
+    The explorer only serves the first EXPLORER_RESULT_WINDOW rows of a query, so once a window
+    is exhausted the query restarts at the last block seen, skipping rows already yielded.
+
+    :return: Generator of pages, each a list of explorer tokentx rows.
+    """
+    boundary_keys = set()
+    while True:
+        last_block = None
+        last_block_keys = set()
+        for page in range(1, EXPLORER_RESULT_WINDOW // TOKENTX_PAGE_SIZE + 1):
+            rows = fetch_token_transfer_page(chain, wallet_address, api_key, start_block, page)
+            fresh = []
+            for tx in rows:
+                block = int(tx["blockNumber"])
+                key = transfer_key(tx)
+                if block != last_block:
+                    last_block = block
+                    last_block_keys = set()
+                last_block_keys.add(key)
+                if block == start_block and key in boundary_keys:
+                    continue
+                fresh.append(tx)
+
+            if fresh:
+                yield fresh
+            if len(rows) < TOKENTX_PAGE_SIZE:
+                return
+
+        if last_block == start_block:
+            # A single block holds more transfers than one window; skip past it rather than loop
+            print(f"Transfers in block {start_block} exceed the explorer window, skipping remainder.")
+            start_block += 1
+            boundary_keys = set()
+        else:
+            start_block = last_block
+            boundary_keys = last_block_keys
+
+
+def get_latest_block(chain, api_key):
+    """Returns the chain's latest block number as seen by the explorer."""
+    data = explorer_get(chain, {"module": "proxy", "action": "eth_blockNumber"}, api_key)
+    return int(data["result"], 16)
+
+
+def apply_transfer(tokens, tx, wallet_address):
+    """
+    Folds one tokentx row into a balance map of raw integer amounts.
+
+    :param tokens: Dictionary of contract address -> token entry, updated in place.
+    :param tx: Explorer tokentx row.
+    :param wallet_address: The wallet whose balances are tracked.
+    """
+    sender = tx["from"].lower()
+    receiver = tx["to"].lower()
+    token_contract = tx["contractAddress"].lower()
+    wallet_address = wallet_address.lower()
+
+    # **Ignore spam tokens**
+    if token_contract in SPAM_TOKENS:
+        return
+
+    # **Initialize token if not already in dictionary**
+    if token_contract not in tokens:
+        tokens[token_contract] = {
+            "name": tx["tokenName"],
+            "symbol": tx["tokenSymbol"],
+            "contract_address": token_contract,
+            "decimals": int(tx["tokenDecimal"]),
+            "raw_balance": 0
+        }
+
+    # **Add balance if received, subtract if sent**
+    if receiver == wallet_address:
+        tokens[token_contract]["raw_balance"] += int(tx["value"])
+    elif sender == wallet_address:
+        tokens[token_contract]["raw_balance"] -= int(tx["value"])
+
+
+def format_holdings(tokens):
+    """
+    Converts a raw balance map into the token list used by the app, dropping dust.
+
+    :param tokens: Dictionary of contract address -> token entry with raw balances.
+    :return: List of tokens with name, symbol, contract_address and balance.
+    """
+    holdings = []
+    for token in tokens.values():
+        balance = token["raw_balance"] / (10 ** token["decimals"])
+        # **Filter out tokens with zero or negative balance**
+        if balance > MIN_BALANCE_THRESHOLD:
+            holdings.append({
+                "name": token["name"],
+                "symbol": token["symbol"],
+                "contract_address": token["contract_address"],
+                "balance": balance
+            })
+    return holdings
+
+
+def get_tokens_held(chain, wallet_address, api_key):
+    """
+    Fetches only the actual ERC-20 tokens held by a wallet on Sonic,
+    excluding transactions and ensuring accurate balances.
+
+    :param chain: The blockchain to query ('sonic').
+    :param wallet_address: The wallet address to check.
+    :param api_key: The API key for the blockchain explorer.
+    :return: A list of token balances the user actually holds.
+    """
+    tokens = {}
+    try:
+        for page in iter_token_transfers(chain, wallet_address, api_key):
+            for tx in page:
+                apply_transfer(tokens, tx, wallet_address)
+    except ExplorerError as e:
+        return {"error": str(e)}
+
+    return format_holdings(tokens)
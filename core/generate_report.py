@@ -1,9 +1,18 @@
 import json
-import requests
+from core.zerepy_client import call_action
 
-def analyze_defi_project(data):
+# Text generation can take a while on the upstream model
+GENERATION_TIMEOUT = 120
+
+# System prompt to guide the AI response
+SYSTEM_PROMPT = "You are a DeFi security expert providing risk analysis for blockchain projects."
+
+# Model selection
+MODEL = "gpt-4o"
+
+def build_prompt(data):
     """
-    Analyzes a DeFi project based on input data and requests a security and risk assessment.
+    Builds the analysis prompt for a project's dashboard stats.
     """
 
     # Extract data from input
@@ -35,30 +44,19 @@ def analyze_defi_project(data):
 
     Provide an expert-level risk analysis for users interacting with this protocol, including security insights, investment risks, and any potential red flags.
     """
+    return prompt
 
-    # System prompt to guide the AI response
-    system_prompt = "You are a DeFi security expert providing risk analysis for blockchain projects."
-
-    # Model selection
-    model = "gpt-4o"
-
-    # API Request Payload
-    payload = {
-        "connection": "openai",
-        "action": "generate-text",
-        "params": [prompt, system_prompt, model]
-    }
-
-    headers = {
-        "accept": "application/json",
-        "Content-Type": "application/json"
-    }
-
-    url = "https://zerepy.auditone.io/agent/action"
+def analyze_defi_project(data):
+    """
+    Analyzes a DeFi project based on input data and requests a security and risk assessment.
+    """
+    prompt = build_prompt(data)
 
     try:
         # Send API request
-        response = requests.post(url, headers=headers, json=payload)
+        response = call_action("openai", "generate-text", [prompt, SYSTEM_PROMPT, MODEL], timeout=GENERATION_TIMEOUT)
+        if response is None:
+            return {"error": "Failed to load agent"}
         response_data = response.json()
 
         if response.status_code == 200:
@@ -68,3 +66,24 @@ def analyze_defi_project(data):
     except Exception as e:
         return {"error": "Request failed", "details": str(e)}
 
+
+def stream_defi_analysis(data, openai_client):
+    """
+    Streams the security and risk assessment of a DeFi project straight from OpenAI.
+
+    :param data: Dashboard stats of the project.
+    :param openai_client: OpenAI client instance.
+    :return: Generator of text chunks, in the order the model produces them.
+    """
+    stream = openai_client.chat.completions.create(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": build_prompt(data)}
+        ],
+        stream=True,
+        timeout=GENERATION_TIMEOUT
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
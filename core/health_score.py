@@ -0,0 +1,218 @@
+import math
+import threading
+import numpy as np
+
+# Inputs a weight profile can weigh; every input is scored 0-100
+FEATURES = ["audit", "sentiment", "liquidity", "noHacks", "tvl", "baseline"]
+
+SENTIMENT_SCORES = {"Bullish": 100, "Neutral": 50}  # Anything else (Bearish, N/A) scores 0
+LIQUIDITY_SCORES = {"Low": 100, "Medium": 50}  # Low liquidity risk is good; High or N/A scores 0
+
+# TVL is scored on a log scale between these bounds (USD)
+TVL_FLOOR = 1e3
+TVL_CEILING = 1e9
+
+# Weight profiles; "default" reproduces the original dashboard formula, including its constant 20 points
+WEIGHT_PROFILES = {
+    "default": {"audit": 0.3, "sentiment": 0.3, "liquidity": 0.2, "baseline": 0.2},
+    "security": {"audit": 0.45, "noHacks": 0.25, "liquidity": 0.15, "sentiment": 0.15},
+    "tvl": {"audit": 0.3, "noHacks": 0.2, "liquidity": 0.15, "sentiment": 0.15, "tvl": 0.2}
+}
+
+# Table behind universe_index(), rebuilt only when a snapshot or TVL refresh has landed since
+universe_lock = threading.Lock()
+universe_cache = {"version": None, "tables": None}
+
+
+def register_profile(name, weights):
+    """
+    Adds or replaces a weight profile.
+
+    :param name: Profile name.
+    :param weights: Dictionary of feature -> weight; features left out weigh 0.
+    """
+    unknown = set(weights) - set(FEATURES)
+    if unknown:
+        raise ValueError(f"Unknown health score features: {', '.join(sorted(unknown))}")
+    WEIGHT_PROFILES[name] = dict(weights)
+
+
+def no_hacks_recorded(hack_data):
+    """Checks whether both SlowMist and Rekt News report "No hacks found" for a project."""
+    if not isinstance(hack_data, dict) or "slowmist" not in hack_data or "rekt_news" not in hack_data:
+        return False
+
+    def no_hacks_found(data):
+        if isinstance(data, dict):
+            return data.get("message", "").lower() == "no hacks found"
+        elif isinstance(data, list):
+            return all(
+                isinstance(item, dict) and item.get("message", "").lower() == "no hacks found" for item in data)
+        return False
+
+    return no_hacks_found(hack_data["slowmist"]) and no_hacks_found(hack_data["rekt_news"])
+
+
+def feature_row(stats):
+    """
+    Extracts the raw health score inputs from dashboard_stats() output.
+
+    :return: Dictionary with "audit", "sentiment", "liquidity", "noHacks" and "tvl" (USD or NaN).
+    """
+    audit = stats.get("auditSecurityScore")
+    token_stats = stats.get("tokenStats") or {}
+    tvl = stats.get("tvlMetrics")
+    total_tvl = tvl.get("totalTvl") if isinstance(tvl, dict) else None
+    return {
+        "audit": audit.get("total_score", 0) if isinstance(audit, dict) else 0,
+        "sentiment": SENTIMENT_SCORES.get(token_stats.get("market_sentiment"), 0),
+        "liquidity": LIQUIDITY_SCORES.get(token_stats.get("liquidity_risk"), 0),
+        "noHacks": 100 if no_hacks_recorded(stats.get("pastHacks")) else 0,
+        "tvl": total_tvl if isinstance(total_tvl, (int, float)) else math.nan
+    }
+
+
+def tvl_scores(tvl):
+    """Maps TVL in USD to 0-100 on a log scale; unknown TVL scores 0."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scaled = (np.log10(tvl) - math.log10(TVL_FLOOR)) / (math.log10(TVL_CEILING) - math.log10(TVL_FLOOR)) * 100
+    return np.nan_to_num(np.clip(scaled, 0, 100), nan=0.0)
+
+
+class HealthIndex:
+    """Projects ranked by health score, answering top-K and threshold queries by slicing."""
+
+    def __init__(self, keys, scores):
+        order = np.argsort(-scores, kind="stable")
+        self.keys = [keys[i] for i in order]
+        self.scores = scores[order]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def count_at_least(self, min_score):
+        """Number of projects scoring min_score or more, by binary search over the sorted scores."""
+        # Scores are descending, so search the negated (ascending) array
+        return int(np.searchsorted(-self.scores, -min_score, side="right"))
+
+    def top(self, k=None, min_score=None):
+        """
+        Lists the best projects, e.g. the safest 20 scoring at least 70.
+
+        :param k: Maximum number of projects, or None for all.
+        :param min_score: Minimum health score, or None for no threshold.
+        :return: List of (key, score) ordered by descending score.
+        """
+        end = len(self.keys) if min_score is None else self.count_at_least(min_score)
+        if k is not None:
+            end = min(end, k)
+        return [(self.keys[i], float(self.scores[i])) for i in range(end)]
+
+
+class HealthScoreTable:
+    """Columnar health score inputs of many projects, scored in one NumPy pass per profile."""
+
+    def __init__(self, keys, audit, sentiment, liquidity, no_hacks, tvl=None):
+        """
+        :param keys: Project identifiers, aligned with the input columns.
+        :param audit: Audit security scores (0-100).
+        :param sentiment: Market sentiment scores (0-100).
+        :param liquidity: Liquidity scores (0-100).
+        :param no_hacks: 100 where no hacks are recorded, else 0.
+        :param tvl: Optional TVL in USD (NaN where unknown).
+        """
+        self.keys = list(keys)
+        count = len(self.keys)
+        self.columns = {
+            "audit": np.asarray(audit, dtype=float),
+            "sentiment": np.asarray(sentiment, dtype=float),
+            "liquidity": np.asarray(liquidity, dtype=float),
+            "noHacks": np.asarray(no_hacks, dtype=float),
+            "tvl": tvl_scores(np.asarray(tvl, dtype=float)) if tvl is not None else np.zeros(count),
+            "baseline": np.full(count, 100.0)
+        }
+        self._indexes = {}
+
+    @classmethod
+    def from_stats(cls, stats):
+        """
+        Builds the table from dashboard_stats() results.
+
+        :param stats: Dictionary of key -> dashboard stats.
+        """
+        rows = [feature_row(project_stats) for project_stats in stats.values()]
+        column = lambda name: np.fromiter((row[name] for row in rows), dtype=float, count=len(rows))
+        return cls(stats.keys(), column("audit"), column("sentiment"), column("liquidity"), column("noHacks"), column("tvl"))
+
+    def scores(self, profile="default"):
+        """
+        Computes every project's health score under a weight profile.
+
+        :return: Array of scores aligned with self.keys.
+        """
+        weights = WEIGHT_PROFILES[profile]
+        matrix = np.column_stack([self.columns[feature] for feature in FEATURES])
+        return matrix @ np.array([weights.get(feature, 0.0) for feature in FEATURES])
+
+    def index(self, profile="default"):
+        """Returns the ranking for a profile, computing and sorting it once per table and weights."""
+        key = (profile, tuple(sorted(WEIGHT_PROFILES[profile].items())))
+        if key not in self._indexes:
+            self._indexes[key] = HealthIndex(self.keys, self.scores(profile))
+        return self._indexes[key]
+
+
+def health_score(stats, profile="default"):
+    """Computes the health score of a single project from its dashboard_stats() output."""
+    return float(HealthScoreTable.from_stats({0: stats}).scores(profile)[0])
+
+
+def universe_version():
+    """
+    Identifies the data universe_tables() is built from: the newest snapshot version and the
+    time of the last TVL metrics refresh. Both are single indexed lookups.
+    """
+    # Imported here so the scoring functions stay usable without a database
+    from core.dashboard_snapshots import collection as snapshots
+    from core.fetch_tvl import metrics_collection
+    latest = snapshots.find_one({}, {"version": 1}, sort=[("version", -1)])
+    # Every metrics document carries the refreshedAt of the last refresh
+    metrics = metrics_collection.find_one({}, {"refreshedAt": 1})
+    return latest and latest["version"], metrics and metrics["refreshedAt"]
+
+
+def universe_tables():
+    """
+    Builds the health score tables of the ranking universe: "tracked" holds every project with
+    a dashboard snapshot, and "pools" adds every token in the Sonic TVL pools without one.
+    Pool-only tokens have no audit, sentiment, liquidity or hack data, so they only rank
+    meaningfully under profiles that weigh TVL.
+
+    :return: Dictionary of "tracked" and "pools" -> HealthScoreTable keyed on (project name, symbol);
+             project name is None for pool-only tokens.
+    """
+    from core.dashboard_snapshots import latest_snapshots
+    from core.fetch_tvl import metrics_collection
+    stats = {(name, snapshot.get("symbol")): snapshot for name, snapshot in latest_snapshots().items()}
+    covered = [symbol.upper() for _, symbol in stats if symbol]
+    pool_stats = dict(stats)
+    for metrics in metrics_collection.find({"_id": {"$nin": covered}}, {"totalTvl": 1}):
+        pool_stats[(None, metrics["_id"])] = {"tvlMetrics": {"totalTvl": metrics["totalTvl"]}}
+    return {"tracked": HealthScoreTable.from_stats(stats), "pools": HealthScoreTable.from_stats(pool_stats)}
+
+
+def universe_index(profile="default"):
+    """
+    Ranks every project with a dashboard snapshot; profiles that weigh TVL also rank every
+    token in the Sonic TVL pools. The tables and their per-profile rankings are reused until
+    the underlying data changes.
+
+    :return: HealthIndex keyed on (project name, symbol).
+    """
+    version = universe_version()
+    with universe_lock:
+        if universe_cache["version"] != version:
+            universe_cache["tables"] = universe_tables()
+            universe_cache["version"] = version
+        tables = universe_cache["tables"]
+    return tables["pools" if WEIGHT_PROFILES[profile].get("tvl") else "tracked"].index(profile)
@@ -0,0 +1,72 @@
+import datetime
+import os
+from dotenv import load_dotenv
+from core.fetch_onchain_balances import get_onchain_balances
+from core.fetch_user_tokens import ExplorerError
+from core.token_ledger import get_ledger_tokens, load_ledger, refresh_ledger
+
+load_dotenv()
+
+# "ledger" rebuilds balances from explorer transfers, "multicall" reads them on-chain
+HOLDINGS_BACKEND = os.getenv("HOLDINGS_BACKEND", "ledger")
+
+# How often (seconds) the multicall backend rescans transfers for newly received tokens
+TOKEN_DISCOVERY_INTERVAL = 600
+
+
+def candidate_tokens(chain, wallet_address, api_key):
+    """
+    Lists every token contract the wallet has interacted with, from its ledger.
+    The ledger is only refreshed when it is older than TOKEN_DISCOVERY_INTERVAL.
+    """
+    ledger = load_ledger(chain, wallet_address)
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=TOKEN_DISCOVERY_INTERVAL)
+    if ledger["updated_at"] is None or ledger["updated_at"] < cutoff:
+        _, tokens = refresh_ledger(chain, wallet_address, api_key)
+    else:
+        tokens = ledger["tokens"]
+    return list(tokens.values())
+
+
+def get_holdings(chain, wallet_address, api_key, backend=HOLDINGS_BACKEND):
+    """
+    Fetches the tokens held by a wallet using the configured holdings backend.
+
+    :param chain: The blockchain to query ('sonic').
+    :param wallet_address: The wallet address to check.
+    :param api_key: The API key for the blockchain explorer.
+    :param backend: "ledger" or "multicall".
+    :return: A list of token balances, in the same shape as get_tokens_held().
+    """
+    if backend != "multicall":
+        return get_ledger_tokens(chain, wallet_address, api_key)
+
+    try:
+        candidates = candidate_tokens(chain, wallet_address, api_key)
+    except ExplorerError as e:
+        return {"error": str(e)}
+
+    try:
+        return get_onchain_balances(wallet_address, candidates)
+    except Exception as e:
+        return {"error": f"Failed to read on-chain balances: {e}"}
+
+
+def held_token_symbol(chain, wallet_address, name, api_key):
+    """
+    Looks up the symbol of a token the wallet holds, by name. The persisted ledger answers
+    without an explorer call; a token it does not know yet, e.g. one received in the
+    unconfirmed blocks, is resolved from get_holdings(), the view the token dropdown lists.
+
+    :return: The token symbol, or None if the wallet holds no token of that name.
+    """
+    for token in load_ledger(chain, wallet_address)["tokens"].values():
+        if token["name"] == name:
+            return token["symbol"]
+
+    holdings = get_holdings(chain, wallet_address, api_key)
+    if isinstance(holdings, list):
+        for token in holdings:
+            if token["name"] == name:
+                return token["symbol"]
+    return None
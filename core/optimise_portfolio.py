@@ -1,82 +1,132 @@
 import copy
-import requests
+from core.portfolio_valuation import security_score
+from core.swap_executor import execute_swaps
 
-ZEREPY_API_URL = "https://zerepy.auditone.io/agent/action"
+# Fractions within this of a full position are swapped in full instead of leaving dust
+FULL_POSITION_TOLERANCE = 1e-6
 
-def rebalance_portfolio(tokens, target_security_score, private_key, top_n=1):
+
+def plan_rebalance(tokens, target_security_score, top_n=1):
     """
-    Adjusts token holdings to achieve a target weighted security score and executes swaps.
+    Computes the smallest-volume set of swaps that lifts the weighted security score to the target.
 
-    :param tokens: List of tokens with security scores and holdings percentage.
+    Swapped-out holdings go to the top_n highest-scoring tokens, split in proportion to their
+    scores, so each unit of portfolio weight moved from token i gains (s_mix - s_i), where s_mix
+    is the score of that destination mix. Reaching a score gap G with the least moved weight is
+    a fractional knapsack: taking weight from the lowest-scoring tokens first maximises the gain
+    per unit moved, so the greedy order below is optimal. Only the last source is swapped
+    partially. Sources are then paired with destinations in one sweep, which needs at most
+    (sources + destinations - 1) swaps.
+
+    :param tokens: List of tokens with security scores, balances and holdings percentage.
     :param target_security_score: Desired weighted security score.
-    :param private_key: User's private key for executing swaps.
     :param top_n: Number of top security tokens to rebalance into.
-    :return: Updated token allocation for swap recommendations.
+    :return: Plan with "swaps", rebalanced "tokens", "current_score", "projected_score" and
+             "moved_percent", or an error dict.
     """
-
-    # Deep copy the tokens list to avoid modifying the input list
     tokens = copy.deepcopy(tokens)
+    scores = [security_score(token) for token in tokens]
 
     # Compute current weighted security score
-    current_weighted_score = sum(
-        (token["holding_percent"] / 100) * token["auditSecurityScore"]["total_score"]
-        for token in tokens
-    )
+    current_weighted_score = sum((token["holding_percent"] / 100) * score for token, score in zip(tokens, scores))
 
     if current_weighted_score >= target_security_score:
         return {"status": "error", "result": "Portfolio already meets or exceeds target security score. No rebalancing needed."}
 
-    # Sort tokens by security score (low to high)
-    tokens_sorted = sorted(tokens, key=lambda x: x["auditSecurityScore"]["total_score"])
-
-    # Identify tokens to swap out (those with the lowest security scores)
-    swap_tokens = []
-    swap_out_holdings = 0
-    for token in tokens_sorted:
-        if token["auditSecurityScore"]["total_score"] < target_security_score:
-            swap_tokens.append(token)
-            swap_out_holdings += token["holding_percent"]
-            token["holding_percent"] = 0  # Remove these from holdings
-
-    if swap_out_holdings == 0:
-        return {"status": "error", "result": "No low-security tokens found to swap out."}
-
     # Identify top N high-security tokens to reallocate into
-    high_security_tokens = sorted(tokens, key=lambda x: x["auditSecurityScore"]["total_score"], reverse=True)[:top_n]
-
-    if not high_security_tokens:
+    ranked = sorted(range(len(tokens)), key=lambda i: scores[i], reverse=True)
+    destinations = [i for i in ranked[:top_n] if scores[i] > 0]
+    if not destinations:
         return {"status": "error", "result": "No high-security tokens available for rebalancing."}
 
-    # Compute total security score of the selected high-security tokens
-    total_high_security_score = sum(t["auditSecurityScore"]["total_score"] for t in high_security_tokens)
+    total_destination_score = sum(scores[i] for i in destinations)
+    shares = {i: scores[i] / total_destination_score for i in destinations}
+    mix_score = sum(shares[i] * scores[i] for i in destinations)
 
-    if total_high_security_score == 0:
-        return {"status": "error", "result": "Total security score of selected tokens is zero. Cannot rebalance."}
-
-    # Perform swaps for each swap-out token
-    for swap_token in swap_tokens:
-        # Select a high-security token to swap into
-        target_token = high_security_tokens[0]  # Example: Swap into the first high-security token
-
-        swap_amount = swap_token["balance"]
-        token_from = swap_token["contract_address"]
-        token_to = target_token["contract_address"]
-
-        # Call the Zerepy API for swap execution
-        payload = {
-            "connection": "sonic",
-            "action": "swap",
-            "params": [private_key, token_from, token_to, str(swap_amount)]
-        }
+    # Lowest scores first: they gain the most per unit of weight moved
+    sources = sorted(
+        (i for i in range(len(tokens)) if i not in shares and scores[i] < mix_score and tokens[i]["holding_percent"] > 0),
+        key=lambda i: scores[i]
+    )
+    if not sources:
+        return {"status": "error", "result": "No low-security tokens found to swap out."}
 
-        response = requests.post(ZEREPY_API_URL, json=payload, headers={"accept": "application/json", "Content-Type": "application/json"})
+    gap = (target_security_score - current_weighted_score) * 100  # in score x percent units
+    moved = []
+    for i in sources:
+        if gap <= 0:
+            break
+        percent = min(tokens[i]["holding_percent"], gap / (mix_score - scores[i]))
+        if tokens[i]["holding_percent"] - percent <= FULL_POSITION_TOLERANCE * tokens[i]["holding_percent"]:
+            percent = tokens[i]["holding_percent"]
+        moved.append((i, percent))
+        gap -= percent * (mix_score - scores[i])
+
+    if gap > FULL_POSITION_TOLERANCE:
+        best_score = current_weighted_score + sum(p * (mix_score - scores[i]) for i, p in moved) / 100
+        return {"status": "error", "result": f"Target security score is not reachable with the top {top_n} tokens. Best achievable score is {best_score:.2f}."}
+
+    # Pair sources with destinations, filling each destination's share of the moved volume in turn
+    total_moved = sum(percent for _, percent in moved)
+    quotas = [[i, shares[i] * total_moved] for i in destinations]
+    swaps = []
+    d = 0
+    for i, percent in moved:
+        position = tokens[i]["holding_percent"]
+        remaining = percent
+        while remaining > FULL_POSITION_TOLERANCE:
+            destination, quota = quotas[d]
+            # The last destination absorbs rounding leftovers
+            amount = remaining if d == len(quotas) - 1 else min(remaining, quota)
+            swaps.append({
+                "from_symbol": tokens[i]["symbol"],
+                "from_contract": tokens[i]["contract_address"],
+                "to_symbol": tokens[destination]["symbol"],
+                "to_contract": tokens[destination]["contract_address"],
+                "percent": amount,
+                "amount": tokens[i]["balance"] * amount / position
+            })
+            remaining -= amount
+            quotas[d][1] -= amount
+            if quotas[d][1] <= FULL_POSITION_TOLERANCE and d < len(quotas) - 1:
+                d += 1
+
+    # Apply the moves to the holdings
+    for i, percent in moved:
+        tokens[i]["holding_percent"] -= percent
+    for destination in destinations:
+        tokens[destination]["holding_percent"] += shares[destination] * total_moved
+
+    projected_score = sum((token["holding_percent"] / 100) * score for token, score in zip(tokens, scores))
+
+    return {
+        "status": "success",
+        "swaps": swaps,
+        "tokens": tokens,
+        "current_score": current_weighted_score,
+        "projected_score": projected_score,
+        "moved_percent": total_moved
+    }
+
+
+def rebalance_portfolio(tokens, target_security_score, private_key, top_n=1, dry_run=False):
+    """
+    Adjusts token holdings to achieve a target weighted security score and executes swaps.
 
-        if response.status_code != 200:
-            return {"status": "error", "result": f"Swap failed for {swap_token['symbol']} → {target_token['symbol']}"}
+    :param tokens: List of tokens with security scores and holdings percentage.
+    :param target_security_score: Desired weighted security score.
+    :param private_key: User's private key for executing swaps.
+    :param top_n: Number of top security tokens to rebalance into.
+    :param dry_run: Return the swap plan from plan_rebalance() without executing it.
+    :return: Updated token allocation for swap recommendations.
+    """
+    plan = plan_rebalance(tokens, target_security_score, top_n)
+    if plan["status"] != "success" or dry_run:
+        return plan
 
-    # Redistribute the swapped holdings proportionally
-    for token in high_security_tokens:
-        weight = token["auditSecurityScore"]["total_score"] / total_high_security_score
-        token["holding_percent"] += swap_out_holdings * weight  # Adjust holdings %
+    # Perform the planned swaps
+    for swap in execute_swaps(plan["swaps"], private_key):
+        if swap["status"] != "success":
+            return {"status": "error", "result": f"Swap failed for {swap['from_symbol']} → {swap['to_symbol']}"}
 
-    return tokens
+    return plan["tokens"]
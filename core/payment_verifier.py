@@ -0,0 +1,146 @@
+import datetime
+import pymongo
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from web3 import Web3
+from web3.exceptions import Web3TypeError
+from utils.db_client import client
+from utils.web3_client import WEB3
+
+db = client["agentDatabase"]
+payments = db["verifiedPayments"]
+
+# AUDIT Token Details
+AUDIT_TOKEN_COST = Web3.to_wei(5, "ether")  # 5 AUDIT tokens required
+AUDIT_TOKEN_ADDRESS = "0x57223D89fE4c8C52023D06E7D30aD10cc441F84e"  # AUDIT Token Contract
+RECIPIENT_ADDRESS = "0x5A8eF3672fFAc8007ce2d025cebEbBAFb7F6e01B"  # Recipient wallet
+
+# keccak256("Transfer(address,address,uint256)"), topic 0 of every ERC-20 Transfer log
+TRANSFER_TOPIC = Web3.keccak(text="Transfer(address,address,uint256)")
+
+
+def ensure_indexes():
+    """Creates the indexes of the payment lookups; the transaction hash is the _id."""
+    payments.create_index([("payer", pymongo.ASCENDING), ("verifiedAt", pymongo.DESCENDING)])
+
+
+def fetch_transaction(tx_hash, web3=WEB3):
+    """
+    Fetches a transaction and its receipt in one JSON-RPC batch, falling back to two calls
+    on providers without batch support.
+
+    :return: Tuple (transaction, receipt).
+    """
+    try:
+        with web3.batch_requests() as batch:
+            batch.add(web3.eth.get_transaction(tx_hash))
+            batch.add(web3.eth.get_transaction_receipt(tx_hash))
+            tx, receipt = batch.execute()
+        return tx, receipt
+    except Web3TypeError:
+        return web3.eth.get_transaction(tx_hash), web3.eth.get_transaction_receipt(tx_hash)
+
+
+def topic_address(topic):
+    """Extracts the address stored in an indexed event topic."""
+    return Web3.to_checksum_address(bytes(topic)[-20:])
+
+
+def paid_amount(receipt, payer, token=AUDIT_TOKEN_ADDRESS, recipient=RECIPIENT_ADDRESS):
+    """
+    Sums the ERC-20 Transfer logs of a receipt that move `token` from `payer` to `recipient`.
+
+    :return: Total amount transferred, in the token's smallest unit.
+    """
+    token, payer, recipient = (Web3.to_checksum_address(address) for address in (token, payer, recipient))
+    total = 0
+    for log in receipt["logs"]:
+        topics = log["topics"]
+        if (Web3.to_checksum_address(log["address"]) != token or len(topics) != 3
+                or bytes(topics[0]) != TRANSFER_TOPIC):
+            continue
+        if topic_address(topics[1]) == payer and topic_address(topics[2]) == recipient:
+            total += int.from_bytes(bytes(log["data"]), "big")
+    return total
+
+
+def verify_payment(tx_hash, payer, web3=WEB3):
+    """
+    Verifies that a transaction paid the report fee from the payer's wallet.
+
+    Verified hashes are stored, so checking one again needs no RPC call, and a hash
+    verified for one wallet is rejected for any other.
+
+    :param tx_hash: Hash of the payment transaction.
+    :param payer: Wallet address expected to have paid.
+    :param web3: Web3 instance to query (a local EVM stand-in in tests).
+    :return: Dictionary with "status" and either "sender" or "reason".
+    """
+    tx_hash = tx_hash.lower()
+    payer = Web3.to_checksum_address(payer)
+
+    known = payments.find_one({"_id": tx_hash})
+    if known:
+        if known["payer"] != payer:
+            return {"status": "failed", "reason": "Payment was made by another wallet."}
+        if known["consumed"]:
+            return {"status": "failed", "reason": "Payment has already been used."}
+        return {"status": "success", "sender": payer, "tx_hash": tx_hash}
+
+    try:
+        tx, receipt = fetch_transaction(tx_hash, web3)
+    except Exception:
+        return {"status": "failed", "reason": "Transaction not found."}
+
+    if not receipt or receipt["status"] != 1:
+        return {"status": "failed", "reason": "Transaction failed or not confirmed."}
+
+    amount = paid_amount(receipt, payer, AUDIT_TOKEN_ADDRESS, RECIPIENT_ADDRESS)
+    if amount < AUDIT_TOKEN_COST:
+        return {"status": "failed", "reason": "Transaction does not transfer the required AUDIT tokens."}
+
+    try:
+        payments.insert_one({
+            "_id": tx_hash,
+            "payer": payer,
+            "sender": tx["from"],
+            "amount": str(amount),
+            "blockNumber": receipt["blockNumber"],
+            "consumed": False,
+            "verifiedAt": datetime.datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        # Verified concurrently; settle on the stored record
+        return verify_payment(tx_hash, payer, web3)
+    return {"status": "success", "sender": payer, "tx_hash": tx_hash}
+
+
+def consume_payment(tx_hash, payer):
+    """
+    Marks a verified payment as spent on a report. Succeeds at most once per payment.
+
+    :return: True if the payment was verified for the payer and not used before.
+    """
+    if not tx_hash:
+        return False
+    return payments.find_one_and_update(
+        {"_id": tx_hash.lower(), "payer": Web3.to_checksum_address(payer), "consumed": False},
+        {"$set": {"consumed": True, "consumedAt": datetime.datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    ) is not None
+
+
+def release_payment(tx_hash, payer):
+    """
+    Returns a consumed payment to the payer, when the report it paid for could not be delivered.
+    The same transaction hash can then be submitted again for a new report.
+
+    :return: True if a consumed payment was released.
+    """
+    if not tx_hash:
+        return False
+    return payments.find_one_and_update(
+        {"_id": tx_hash.lower(), "payer": Web3.to_checksum_address(payer), "consumed": True},
+        {"$set": {"consumed": False}, "$unset": {"consumedAt": ""}},
+        return_document=ReturnDocument.AFTER
+    ) is not None
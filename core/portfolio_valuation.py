@@ -0,0 +1,53 @@
+import numpy as np
+
+
+def numeric_or_nan(value):
+    """Maps "NA"/"N/A" and other non-numeric placeholders to NaN."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return np.nan
+
+
+def security_score(protocol_stats):
+    """Extracts the audit total_score, treating missing audit data as 0."""
+    audit = protocol_stats.get("auditSecurityScore")
+    return audit.get("total_score", 0) if isinstance(audit, dict) else 0
+
+
+def value_portfolio(tokens, stats):
+    """
+    Values a portfolio in one vectorized pass over columnar holdings and prices.
+
+    :param tokens: List of held tokens (name, symbol, contract_address, balance).
+    :param stats: List of dashboard_stats() results, aligned with tokens.
+    :return: Dictionary with the merged per-token rows ("tokens"), "total_value",
+             "weighted_security_score" and "weighted_health_score".
+    """
+    count = len(tokens)
+    balances = np.fromiter((token["balance"] for token in tokens), dtype=float, count=count)
+    prices = np.ma.masked_invalid(np.fromiter(
+        (numeric_or_nan(s.get("tokenStats", {}).get("price_usd")) for s in stats), dtype=float, count=count
+    ))
+    security = np.fromiter((security_score(s) for s in stats), dtype=float, count=count)
+    health = np.fromiter((s.get("healthScore", 0) for s in stats), dtype=float, count=count)
+
+    # Tokens without a price are masked out and contribute no value
+    values = (balances * prices).filled(0.0)
+    total_value = values.sum()
+    weights = values / total_value if total_value > 0 else np.zeros(count)
+
+    value_usd = np.round(values, 2).tolist()
+    price_usd = np.round(prices.filled(0.0), 4).tolist()
+    holding_percent = np.round(weights * 100, 2).tolist()
+
+    rows = [
+        {**token, "value_usd": value_usd[i], "price_usd": price_usd[i], **stats[i], "holding_percent": holding_percent[i]}
+        for i, token in enumerate(tokens)
+    ]
+
+    return {
+        "tokens": rows,
+        "total_value": float(total_value),
+        "weighted_security_score": float(weights @ security),
+        "weighted_health_score": float(weights @ health)
+    }
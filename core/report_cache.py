@@ -0,0 +1,99 @@
+import datetime
+import hashlib
+import json
+import math
+import os
+from utils.db_client import client
+from utils.markdown_cache import render_markdown
+from core.generate_report import MODEL, SYSTEM_PROMPT, analyze_defi_project, build_prompt
+
+db = client["agentDatabase"]
+cache = db["reportCache"]
+
+# Seconds a generated analysis may be reused for an identical prompt
+REPORT_CACHE_TTL = int(os.getenv("REPORT_CACHE_TTL", 6 * 3600))
+
+# Significant digits kept of volatile market figures, so small price moves still hit the cache
+REPORT_CACHE_DIGITS = int(os.getenv("REPORT_CACHE_DIGITS", 2))
+
+# Cached analyses are dropped by a TTL index after this many seconds
+REPORT_CACHE_RETENTION = 7 * 24 * 3600
+
+# Token stats that move between otherwise identical analyses
+VOLATILE_FIELDS = ["price_usd", "total_volume_24h", "liquidity_ratio", "buy_sell_ratio"]
+
+
+def ensure_indexes():
+    """Creates the retention policy of the report cache; lookups use the _id key."""
+    cache.create_index("createdAt", expireAfterSeconds=REPORT_CACHE_RETENTION)
+
+
+def bucket(value, digits=REPORT_CACHE_DIGITS):
+    """
+    Rounds a number, or a formatted number like "1,234,567", to `digits` significant digits.
+    Other values are returned unchanged.
+    """
+    try:
+        number = float(str(value).replace(",", ""))
+    except ValueError:
+        return value
+    if not number or not math.isfinite(number):
+        return number
+    return round(number, digits - 1 - int(math.floor(math.log10(abs(number)))))
+
+
+def cache_key(data):
+    """
+    Content hash of an analysis request: the model, the system prompt and the prompt built
+    from the stats with their volatile fields bucketed.
+    """
+    token_stats = dict(data.get("tokenStats") or {})
+    for field in VOLATILE_FIELDS:
+        if field in token_stats:
+            token_stats[field] = bucket(token_stats[field])
+    prompt = build_prompt(dict(data, tokenStats=token_stats))
+    return hashlib.sha256(json.dumps([MODEL, SYSTEM_PROMPT, prompt]).encode()).hexdigest()
+
+
+def lookup_analysis(key, max_age=REPORT_CACHE_TTL):
+    """
+    Fetches a cached analysis younger than max_age seconds.
+
+    :return: Dictionary with "markdown" and "html", or None on a miss.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=max_age)
+    return cache.find_one({"_id": key, "createdAt": {"$gte": cutoff}}, {"markdown": 1, "html": 1})
+
+
+def store_analysis(key, markdown):
+    """
+    Renders a generated analysis and stores it under its cache key.
+
+    :return: The rendered HTML.
+    """
+    html = render_markdown(markdown)
+    cache.replace_one(
+        {"_id": key},
+        {"markdown": markdown, "html": html, "model": MODEL, "createdAt": datetime.datetime.utcnow()},
+        upsert=True
+    )
+    return html
+
+
+def cached_analysis(data, max_age=REPORT_CACHE_TTL):
+    """
+    Returns the analysis of a project, reusing a fresh identical one when available.
+
+    :param data: Dashboard stats of the project, as passed to analyze_defi_project().
+    :param max_age: Maximum age in seconds of a reusable analysis.
+    :return: Dictionary with "result" (markdown), "html" and "cached", or the error from analyze_defi_project().
+    """
+    key = cache_key(data)
+    entry = lookup_analysis(key, max_age)
+    if entry:
+        return {"result": entry["markdown"], "html": entry["html"], "cached": True}
+
+    result = analyze_defi_project(data)
+    if "result" not in result:
+        return result
+    return {"result": result["result"], "html": store_analysis(key, result["result"]), "cached": False}
@@ -0,0 +1,165 @@
+import datetime
+import uuid
+import pymongo
+from pymongo import ReturnDocument
+from utils.db_client import client
+from assessment.calculation import dashboard_stats
+from core.report_cache import cached_analysis
+from core.payment_verifier import release_payment
+
+db = client["agentDatabase"]
+jobs = db["reportJobs"]
+
+# A running job not finished within this many seconds is assumed lost and handed to another worker
+JOB_LEASE = 300
+
+# Attempts before a job is marked failed for good
+MAX_ATTEMPTS = 3
+
+# Finished job documents are dropped after this many seconds; the reports themselves stay in db.reports
+JOB_RETENTION = 7 * 24 * 3600
+
+
+def ensure_indexes():
+    """Creates the indexes the claim query, the status lookups and the retention policy rely on."""
+    jobs.create_index([("status", pymongo.ASCENDING), ("createdAt", pymongo.ASCENDING)])
+    jobs.create_index([("_id", pymongo.ASCENDING), ("userId", pymongo.ASCENDING)])
+    jobs.create_index("createdAt", expireAfterSeconds=JOB_RETENTION)
+
+
+def enqueue_report(user_id, name, symbol, payment_tx=None):
+    """
+    Queues a report generation for a paid request.
+
+    :param user_id: Wallet address of the requesting user.
+    :param name: Project name the report is about.
+    :param symbol: Token symbol of the project.
+    :param payment_tx: Hash of the consumed payment, released again if the job fails for good.
+    :return: The queued job document.
+    """
+    job = {
+        "_id": uuid.uuid4().hex,
+        "userId": user_id,
+        "protocol": name,
+        "symbol": symbol,
+        "paymentTx": payment_tx,
+        "status": "queued",
+        "attempts": 0,
+        "createdAt": datetime.datetime.utcnow()
+    }
+    jobs.insert_one(job)
+    return job
+
+
+def claim_job(worker_id):
+    """
+    Atomically takes the oldest queued job, or a running job whose lease expired with attempts
+    left. Jobs that ran out of attempts this way are failed by fail_abandoned_jobs().
+
+    :param worker_id: Identifier recorded on the job for debugging.
+    :return: The claimed job document, or None when the queue is empty.
+    """
+    now = datetime.datetime.utcnow()
+    return jobs.find_one_and_update(
+        {"$or": [
+            {"status": "queued"},
+            {"status": "running", "leaseExpiresAt": {"$lt": now}, "attempts": {"$lt": MAX_ATTEMPTS}}
+        ]},
+        {
+            "$set": {
+                "status": "running",
+                "worker": worker_id,
+                "startedAt": now,
+                "leaseExpiresAt": now + datetime.timedelta(seconds=JOB_LEASE)
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("createdAt", pymongo.ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def fail_abandoned_jobs():
+    """
+    Fails the jobs whose last attempt lost its worker (crash, OOM, deploy) before finishing,
+    and releases their payments. Each job is taken atomically, so its payment is released once.
+
+    :return: Number of jobs failed.
+    """
+    failed = 0
+    while True:
+        job = jobs.find_one_and_update(
+            {"status": "running", "leaseExpiresAt": {"$lt": datetime.datetime.utcnow()}, "attempts": {"$gte": MAX_ATTEMPTS}},
+            {"$set": {"status": "failed", "error": "Report generation did not finish"}, "$unset": {"leaseExpiresAt": ""}},
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            return failed
+        if release_payment(job.get("paymentTx"), job["userId"]):
+            jobs.update_one({"_id": job["_id"]}, {"$set": {"paymentReleased": True}})
+        failed += 1
+
+
+def store_report(user_id, name, symbol, report_html):
+    """
+    Saves a finished report to the user's reports.
+
+    :return: The inserted report document.
+    """
+    report_data = {
+        "_id": uuid.uuid4().hex,
+        "protocol": name,
+        "symbol": symbol,
+        "reportContent": report_html,
+        "userId": user_id,
+        "createdAt": datetime.datetime.utcnow()
+    }
+    db.reports.insert_one(report_data)
+    return report_data
+
+
+def run_job(job):
+    """
+    Generates the report for a claimed job, stores it in db.reports and completes the job.
+
+    :param job: Job document from claim_job().
+    :return: The finished job document.
+    """
+    try:
+        data = dashboard_stats(job["protocol"], job["symbol"])
+        result = cached_analysis(data)
+    except Exception as e:
+        result = {"error": "Report generation failed", "details": str(e)}
+
+    if "result" not in result:
+        # Leave the job queued for another attempt unless it has used them all
+        status = "failed" if job["attempts"] >= MAX_ATTEMPTS else "queued"
+        update = {"status": status, "error": result.get("error", "Report generation failed")}
+        if status == "failed" and release_payment(job.get("paymentTx"), job["userId"]):
+            # No report was delivered, so the payment can be used for another request
+            update["paymentReleased"] = True
+        jobs.update_one({"_id": job["_id"]}, {"$set": update, "$unset": {"leaseExpiresAt": ""}})
+        return dict(job, **update)
+
+    report_data = store_report(job["userId"], job["protocol"], job["symbol"], result["html"])
+    update = {"status": "done", "reportId": report_data["_id"], "cached": result["cached"], "finishedAt": datetime.datetime.utcnow()}
+    jobs.update_one({"_id": job["_id"]}, {"$set": update, "$unset": {"leaseExpiresAt": "", "error": ""}})
+    return dict(job, **update)
+
+
+def get_job(job_id, user_id):
+    """
+    Looks up a user's job together with its report once finished.
+
+    :return: Dictionary with the job status (and "report" when done), or None if not found.
+    """
+    job = jobs.find_one({"_id": job_id, "userId": user_id})
+    if not job:
+        return None
+    status = {"jobId": job["_id"], "status": job["status"], "protocol": job["protocol"]}
+    if job["status"] == "done":
+        status["report"] = db.reports.find_one({"_id": job["reportId"]})
+    elif job.get("error"):
+        status["error"] = job["error"]
+        status["paymentReleased"] = job.get("paymentReleased", False)
+    return status
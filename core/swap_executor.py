@@ -0,0 +1,221 @@
+import concurrent.futures
+import datetime
+import uuid
+import requests
+from pymongo import ReturnDocument
+from utils.db_client import client
+from core.zerepy_client import call_action
+
+db = client["agentDatabase"]
+executed_swaps = db["executed_swaps"]
+
+# Swaps wait for on-chain execution, so allow longer than a stats lookup
+SWAP_TIMEOUT = 120
+
+# Swap statuses a resumed run sends again. A swap the server never answered for is
+# "unconfirmed": it may have been broadcast, so it is not resent automatically.
+RETRYABLE_STATUSES = {"pending", "failed", "blocked"}
+
+# A running run whose updated_at is older than this (seconds) lost its executor and can be
+# taken over. run_swaps() refreshes updated_at before and after every swap, so the longest
+# legitimate gap is one swap request.
+SWAP_RUN_LEASE = SWAP_TIMEOUT + 30
+
+# Runs executing at once in this process. Runs stay in memory because the private key is
+# never stored; a run lost with its process is resumed through claim_swap_run().
+SWAP_RUN_WORKERS = 8
+swap_run_pool = concurrent.futures.ThreadPoolExecutor(max_workers=SWAP_RUN_WORKERS, thread_name_prefix="swap-run")
+
+
+class LeaseLost(Exception):
+    """Raised when another request took over a swap run this executor was running."""
+
+
+def submit_swap(private_key, swap):
+    """
+    Sends one swap to the ZerePy swap action.
+
+    The server signs and broadcasts the approval and the swap itself, picking their nonces,
+    so swaps of one wallet are sent one at a time.
+
+    :return: Tuple (status, error), status being "success", "failed" or "unconfirmed".
+    """
+    try:
+        response = call_action(
+            "sonic", "swap",
+            [private_key, swap["from_contract"], swap["to_contract"], str(swap["amount"])],
+            timeout=SWAP_TIMEOUT, coalesce=False
+        )
+    except requests.exceptions.RequestException as e:
+        # The request may have reached the server before the connection failed
+        return "unconfirmed", f"No response from the swap service: {e}"
+    if response is None:
+        return "failed", "Failed to load agent"
+    if response.status_code != 200:
+        return "failed", f"Swap request failed with status {response.status_code}"
+    return "success", None
+
+
+def execute_swaps(swaps, private_key, on_update=None):
+    """
+    Executes the unfinished swaps of a plan in order, stopping at the first one that does not
+    succeed; the swaps after it are marked "blocked" and sent when the run is resumed.
+
+    :param swaps: Planned swaps (from plan_rebalance), updated in place with their status.
+    :param private_key: User's private key for executing swaps.
+    :param on_update: Optional callback(index, swap) invoked on every status change.
+    :return: The swaps list.
+    """
+    def update(index, **fields):
+        swaps[index].update(fields)
+        if on_update:
+            on_update(index, swaps[index])
+
+    pending = [i for i, swap in enumerate(swaps) if swap.get("status", "pending") in RETRYABLE_STATUSES]
+    for position, index in enumerate(pending):
+        update(index, status="submitted", error=None)
+        status, error = submit_swap(private_key, swaps[index])
+        update(index, status=status, error=error)
+        if status != "success":
+            for blocked in pending[position + 1:]:
+                update(blocked, status="blocked", error=f"Swap {index + 1} did not complete")
+            break
+    return swaps
+
+
+def create_swap_run(user_id, flow_id, original_holdings, plan):
+    """
+    Persists a planned rebalance to executed_swaps before any swap is sent.
+
+    :return: The run document, leased to the caller.
+    """
+    now = datetime.datetime.utcnow()
+    run = {
+        "_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "flow_id": flow_id,
+        "status": "running",
+        "lease_id": uuid.uuid4().hex,
+        "original_holdings": original_holdings,
+        "new_holdings": plan["tokens"],
+        "swaps": [dict(swap, status="pending") for swap in plan["swaps"]],
+        "executed_at": now,
+        "updated_at": now
+    }
+    executed_swaps.insert_one(run)
+    return run
+
+
+def claim_swap_run(run_id, user_id):
+    """
+    Atomically takes over a user's partial run, or a running run whose executor stopped
+    refreshing its lease, so two concurrent resume requests cannot both send its swaps.
+
+    A swap left "submitted" by a lost executor may have been broadcast, so it is marked
+    "unconfirmed" and never resent.
+
+    :return: The claimed run document, or None if the run is missing or not resumable.
+    """
+    now = datetime.datetime.utcnow()
+    run = executed_swaps.find_one_and_update(
+        {"_id": run_id, "user_id": user_id, "$or": [
+            {"status": "partial"},
+            {"status": "running", "updated_at": {"$lt": now - datetime.timedelta(seconds=SWAP_RUN_LEASE)}}
+        ]},
+        {"$set": {"status": "running", "lease_id": uuid.uuid4().hex, "updated_at": now}},
+        return_document=ReturnDocument.AFTER
+    )
+    if run is None:
+        return None
+
+    interrupted = {}
+    for index, swap in enumerate(run["swaps"]):
+        if swap["status"] == "submitted":
+            swap.update(status="unconfirmed", error="The run was interrupted while this swap was in flight")
+            interrupted[f"swaps.{index}"] = swap
+    if interrupted:
+        executed_swaps.update_one({"_id": run_id, "lease_id": run["lease_id"]}, {"$set": interrupted})
+    return run
+
+
+def run_status(swaps):
+    """
+    Summarizes swap statuses: "completed" when every swap succeeded, "partial" while some can be
+    resumed, and "unconfirmed" when only swaps of unknown outcome remain.
+    """
+    if all(swap["status"] == "success" for swap in swaps):
+        return "completed"
+    if any(swap["status"] in RETRYABLE_STATUSES for swap in swaps):
+        return "partial"
+    return "unconfirmed"
+
+
+def run_swaps(run, private_key):
+    """
+    Executes (or resumes) a leased swap run, recording each swap's progress as it happens.
+    Every write is fenced on the run's lease_id, so an executor that lost its lease stops
+    before sending another swap.
+
+    :param run: Run document from create_swap_run() or claim_swap_run().
+    :return: The run document with final swap statuses and run status.
+    :raises LeaseLost: If another request took the run over.
+    """
+    def persist(index, swap):
+        result = executed_swaps.update_one(
+            {"_id": run["_id"], "lease_id": run["lease_id"]},
+            {"$set": {f"swaps.{index}": swap, "updated_at": datetime.datetime.utcnow()}}
+        )
+        if result.matched_count == 0:
+            raise LeaseLost(f"Swap run {run['_id']} was taken over")
+
+    execute_swaps(run["swaps"], private_key, on_update=persist)
+
+    run["status"] = run_status(run["swaps"])
+    executed_swaps.update_one(
+        {"_id": run["_id"], "lease_id": run["lease_id"]},
+        {"$set": {"status": run["status"], "updated_at": datetime.datetime.utcnow()}}
+    )
+    return run
+
+
+def start_swap_run(run, private_key):
+    """
+    Runs a leased swap run in the background; poll get_swap_run() for its progress.
+
+    :return: Future of the run_swaps() result.
+    """
+    def run_in_background():
+        try:
+            return run_swaps(run, private_key)
+        except LeaseLost as e:
+            print(str(e))
+        except Exception as e:
+            # The lease expires and the run can be resumed
+            print(f"Swap run {run['_id']} stopped: {e}")
+
+    return swap_run_pool.submit(run_in_background)
+
+
+def get_swap_run(run_id, user_id):
+    """
+    Looks up the progress of a user's swap run.
+
+    :return: Dictionary with the run status, swap statuses and, once completed, the new holdings;
+             or None if not found.
+    """
+    run = executed_swaps.find_one({"_id": run_id, "user_id": user_id})
+    if not run:
+        return None
+    status = {
+        "runId": run["_id"],
+        "status": run["status"],
+        "swaps": [{
+            "from_symbol": swap.get("from_symbol"),
+            "to_symbol": swap.get("to_symbol"),
+            "status": swap["status"],
+            "error": swap.get("error")
+        } for swap in run["swaps"]]
+    }
+    if run["status"] == "completed":
+        status["newHoldings"] = run["new_holdings"]
+    return status
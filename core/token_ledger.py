@@ -0,0 +1,103 @@
+import datetime
+import os
+from dotenv import load_dotenv
+from utils.db_client import client
+from core.fetch_user_tokens import (
+    ExplorerError, apply_transfer, format_holdings, get_latest_block, iter_token_transfers
+)
+
+load_dotenv()
+
+db = client["agentDatabase"]
+ledgers = db["walletLedgers"]
+
+# Transfers newer than this many blocks are treated as unconfirmed: they are applied to the
+# returned balances but never persisted, so a reorg within the window cannot corrupt the ledger
+CONFIRMATION_BLOCKS = int(os.getenv("LEDGER_CONFIRMATION_BLOCKS", 64))
+
+
+def ledger_id(chain, wallet_address):
+    return f"{chain}:{wallet_address.lower()}"
+
+
+def load_ledger(chain, wallet_address):
+    """
+    Loads a wallet's persisted ledger, with raw balances converted back to integers.
+
+    :return: Ledger dict with "confirmed_block", "tokens" and "updated_at", or an empty ledger.
+    """
+    doc = ledgers.find_one({"_id": ledger_id(chain, wallet_address)})
+    if not doc:
+        return {"confirmed_block": 0, "tokens": {}, "updated_at": None}
+
+    tokens = {}
+    for contract, token in doc["tokens"].items():
+        tokens[contract] = dict(token, raw_balance=int(token["raw_balance"]))
+    return {"confirmed_block": doc["confirmedBlock"], "tokens": tokens, "updated_at": doc["updatedAt"]}
+
+
+def save_ledger(chain, wallet_address, previous_block, confirmed_block, tokens):
+    """
+    Persists confirmed balances, unless a concurrent refresh already advanced the ledger.
+    Raw balances are stored as strings since they can exceed Mongo's 64-bit integers.
+    """
+    stored_tokens = {contract: dict(token, raw_balance=str(token["raw_balance"])) for contract, token in tokens.items()}
+    doc = {
+        "chain": chain,
+        "wallet_address": wallet_address.lower(),
+        "confirmedBlock": confirmed_block,
+        "tokens": stored_tokens,
+        "updatedAt": datetime.datetime.utcnow()
+    }
+    query = {"_id": ledger_id(chain, wallet_address)}
+    if previous_block:
+        query["confirmedBlock"] = previous_block
+    ledgers.update_one(query, {"$set": doc}, upsert=not previous_block)
+
+
+def refresh_ledger(chain, wallet_address, api_key):
+    """
+    Brings a wallet's ledger up to date by applying only the transfers after its last
+    confirmed block.
+
+    :return: Tuple (confirmed tokens, tokens including unconfirmed transfers), as raw balance maps.
+    """
+    ledger = load_ledger(chain, wallet_address)
+    previous_block = ledger["confirmed_block"]
+    safe_block = get_latest_block(chain, api_key) - CONFIRMATION_BLOCKS
+
+    confirmed = {contract: dict(token) for contract, token in ledger["tokens"].items()}
+    unconfirmed = []
+    for page in iter_token_transfers(chain, wallet_address, api_key, start_block=previous_block + 1):
+        for tx in page:
+            if int(tx["blockNumber"]) <= safe_block:
+                apply_transfer(confirmed, tx, wallet_address)
+            else:
+                unconfirmed.append(tx)
+
+    if safe_block > previous_block:
+        save_ledger(chain, wallet_address, previous_block, safe_block, confirmed)
+
+    # Recent transfers are re-read on every refresh, so reorged ones simply disappear
+    current = {contract: dict(token) for contract, token in confirmed.items()}
+    for tx in unconfirmed:
+        apply_transfer(current, tx, wallet_address)
+
+    return confirmed, current
+
+
+def get_ledger_tokens(chain, wallet_address, api_key):
+    """
+    Fetches the tokens held by a wallet from its incrementally maintained ledger.
+
+    :param chain: The blockchain to query ('sonic').
+    :param wallet_address: The wallet address to check.
+    :param api_key: The API key for the blockchain explorer.
+    :return: A list of token balances, in the same shape as get_tokens_held().
+    """
+    try:
+        _, current = refresh_ledger(chain, wallet_address, api_key)
+    except ExplorerError as e:
+        return {"error": str(e)}
+
+    return format_holdings(current)
@@ -0,0 +1,120 @@
+import datetime
+import numpy as np
+from pymongo.errors import CollectionInvalid
+from utils.db_client import client
+
+db = client["agentDatabase"]
+history = db["tvlSonicHistory"]
+daily = db["tvlSonicDaily"]
+
+# Raw per-ingestion points are kept this long; daily rollups much longer
+RAW_RETENTION = 30 * 24 * 3600
+DAILY_RETENTION = 400 * 24 * 3600
+
+# Fields recorded per pool at every ingestion
+METRIC_FIELDS = ["tvlUsd", "apyBase", "sigma", "volumeUsd1d", "volumeUsd7d"]
+
+
+def ensure_collections():
+    """Creates the time-series collection, the rollup indexes and their retention policies."""
+    try:
+        db.create_collection(
+            history.name,
+            timeseries={"timeField": "ts", "metaField": "meta", "granularity": "hours"},
+            expireAfterSeconds=RAW_RETENTION
+        )
+    except CollectionInvalid:
+        pass  # Already exists
+    history.create_index([("meta.pool", 1), ("ts", 1)])
+    daily.create_index([("_id.pool", 1), ("day", 1)])
+    daily.create_index("day", expireAfterSeconds=DAILY_RETENTION)
+
+
+def history_point(pool, ts):
+    """Builds the compact time-series point recorded for one pool."""
+    point = {
+        "ts": ts,
+        "meta": {"pool": pool["pool"], "project": pool.get("project"), "symbol": pool.get("symbol")}
+    }
+    for field in METRIC_FIELDS:
+        point[field] = pool.get(field)
+    return point
+
+
+def record_points(points):
+    """Appends one ingestion's points to the time-series collection."""
+    if points:
+        history.insert_many(points, ordered=False)
+
+
+def rollup_daily(days=2):
+    """
+    Folds the raw points of the last `days` days into per-pool daily averages.
+    Re-running over the same days replaces their rollups, so it is safe after every ingestion.
+    """
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    group = {"_id": {"pool": "$meta.pool", "day": {"$dateTrunc": {"date": "$ts", "unit": "day"}}}}
+    for field in METRIC_FIELDS:
+        group[field] = {"$avg": f"${field}"}
+    group["samples"] = {"$sum": 1}
+
+    history.aggregate([
+        {"$match": {"ts": {"$gte": since.replace(hour=0, minute=0, second=0, microsecond=0)}}},
+        {"$group": group},
+        {"$set": {"day": "$_id.day"}},
+        {"$merge": {"into": daily.name, "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ])
+
+
+def pool_history(pool_id, start, end, interval="hour"):
+    """
+    Range query over a pool's history, downsampled to the given interval.
+
+    :param pool_id: DeFi Llama pool id.
+    :param start: Range start (datetime, inclusive).
+    :param end: Range end (datetime, exclusive).
+    :param interval: "hour" reads raw points; "day" reads the daily rollups.
+    :return: List of points ordered by time, each with "ts" and the averaged metrics.
+    """
+    if interval == "day":
+        projection = {field: 1 for field in METRIC_FIELDS}
+        projection.update({"_id": 0, "ts": "$day"})
+        return list(daily.find({"_id.pool": pool_id, "day": {"$gte": start, "$lt": end}}, projection).sort("day", 1))
+
+    group = {"_id": {"$dateTrunc": {"date": "$ts", "unit": interval}}}
+    for field in METRIC_FIELDS:
+        group[field] = {"$avg": f"${field}"}
+    return list(history.aggregate([
+        {"$match": {"meta.pool": pool_id, "ts": {"$gte": start, "$lt": end}}},
+        {"$group": group},
+        {"$sort": {"_id": 1}},
+        {"$set": {"ts": "$_id"}},
+        {"$unset": "_id"}
+    ]))
+
+
+def tvl_trend(pool_id, days=90):
+    """
+    Computes TVL and APY trends for a pool from its daily rollups.
+
+    :param pool_id: DeFi Llama pool id.
+    :param days: Length of the trend window in days.
+    :return: Dictionary with tvlChangePct, tvlSlopePerDay, apyDrift and numDays, or None without data.
+    """
+    end = datetime.datetime.utcnow()
+    points = pool_history(pool_id, end - datetime.timedelta(days=days), end, interval="day")
+    if not points:
+        return None
+
+    tvl = np.array([p.get("tvlUsd") or 0 for p in points], dtype=float)
+    apy = np.array([p.get("apyBase") or 0 for p in points], dtype=float)
+    elapsed_days = np.array([(p["ts"] - points[0]["ts"]).total_seconds() / 86400 for p in points])
+
+    slope = float(np.polyfit(elapsed_days, tvl, 1)[0]) if len(points) > 1 else 0.0
+    return {
+        "pool": pool_id,
+        "tvlChangePct": round(float((tvl[-1] - tvl[0]) / tvl[0] * 100), 2) if tvl[0] else 0.0,
+        "tvlSlopePerDay": round(slope, 2),
+        "apyDrift": round(float(apy[-1] - apy[0]), 4),
+        "numDays": len(points)
+    }
@@ -0,0 +1,82 @@
+import datetime
+import uuid
+import pymongo
+from utils.db_client import client
+
+db = client["agentDatabase"]
+users = db["users_sonic"]
+activity = db["userActivity"]
+daily = db["userActivityDaily"]
+weekly = db["userActivityWeekly"]
+
+# Access times kept on the user document; the full history lives in userActivity
+RECENT_ACCESS_LIMIT = 20
+
+# Raw activity events are dropped by a TTL index after this many seconds
+ACTIVITY_RETENTION = 180 * 24 * 3600
+
+
+def ensure_indexes():
+    """Creates the indexes the per-user reads, the rollups and the retention policy rely on."""
+    activity.create_index([("wallet_address", pymongo.ASCENDING), ("ts", pymongo.DESCENDING)])
+    activity.create_index("ts", expireAfterSeconds=ACTIVITY_RETENTION)
+    daily.create_index([("_id.wallet_address", pymongo.ASCENDING), ("day", pymongo.DESCENDING)])
+    weekly.create_index([("_id.wallet_address", pymongo.ASCENDING), ("week", pymongo.DESCENDING)])
+
+
+def record_login(wallet_address):
+    """
+    Creates or updates the user in one atomic upsert and appends the login to the activity log.
+
+    :param wallet_address: The wallet that connected.
+    """
+    now = datetime.datetime.utcnow()
+    users.update_one(
+        {"wallet_address": wallet_address},
+        {
+            "$setOnInsert": {"_id": uuid.uuid4().hex, "created_at": now},
+            "$set": {"last_access": now},
+            "$push": {"access_times": {"$each": [now], "$slice": -RECENT_ACCESS_LIMIT}}
+        },
+        upsert=True
+    )
+    activity.insert_one({"wallet_address": wallet_address, "event": "login", "ts": now})
+
+
+def rollup_activity(days=8):
+    """
+    Recomputes per-user daily and weekly event counts for the last `days` days.
+    Re-running over the same period replaces its rollups, so it is safe to run repeatedly.
+    """
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    # Start on a week boundary so the oldest weekly bucket is recomputed from all its events
+    since -= datetime.timedelta(days=since.weekday())
+    since = since.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    for collection, unit, field in [(daily, "day", "day"), (weekly, "week", "week")]:
+        period = {"$dateTrunc": {"date": "$ts", "unit": unit, "startOfWeek": "monday"}}
+        activity.aggregate([
+            {"$match": {"ts": {"$gte": since}}},
+            {"$group": {
+                "_id": {"wallet_address": "$wallet_address", field: period},
+                "events": {"$sum": 1},
+                "logins": {"$sum": {"$cond": [{"$eq": ["$event", "login"]}, 1, 0]}},
+                "firstSeen": {"$min": "$ts"},
+                "lastSeen": {"$max": "$ts"}
+            }},
+            {"$set": {field: f"$_id.{field}"}},
+            {"$merge": {"into": collection.name, "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ])
+
+
+def user_activity_summary(wallet_address, days=30):
+    """
+    Fetches a user's precomputed daily activity.
+
+    :return: List of {"day", "events", "logins"} ordered by day.
+    """
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    return list(daily.find(
+        {"_id.wallet_address": wallet_address, "day": {"$gte": since}},
+        {"_id": 0, "day": 1, "events": 1, "logins": 1}
+    ).sort("day", pymongo.ASCENDING))
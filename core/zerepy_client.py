@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from utils.concurrency import SingleFlight
+
+load_dotenv()
+
+ZEREPY_BASE_URL = os.getenv("ZEREPY_BASE_URL", "https://zerepy.auditone.io")
+ZEREPY_API_URL = f"{ZEREPY_BASE_URL}/agent/action"
+AGENT_NAME = "auditone-sonic"
+
+# How long (seconds) a successful agent load is trusted before loading again
+AGENT_LOADED_TTL = 600
+
+# Default timeout (seconds) for an action call
+ACTION_TIMEOUT = 30
+
+# Connection pool size of the shared session, sized for the fan-out concurrency
+POOL_MAXSIZE = 32
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+_agent_loaded_at = 0
+_agent_lock = threading.Lock()
+
+# Coalesces identical in-flight action calls across request threads
+action_flights = SingleFlight()
+
+
+def get_session():
+    """
+    Returns the pooled keep-alive session for this worker process, creating it on first use
+    (and again after a fork, so workers never share sockets).
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"accept": "application/json"})
+            _session = session
+            _session_pid = os.getpid()
+        return _session
+
+
+def load_agent(force=False):
+    """
+    Ensures the agent is loaded, reusing a recent successful load unless forced.
+
+    :param force: Reload even if the agent was loaded within AGENT_LOADED_TTL.
+    :return: True if the agent is loaded, False otherwise.
+    """
+    global _agent_loaded_at
+    with _agent_lock:
+        if not force and time.monotonic() - _agent_loaded_at < AGENT_LOADED_TTL:
+            return True
+
+        url = f"{ZEREPY_BASE_URL}/agents/{AGENT_NAME}/load"
+        try:
+            response = get_session().post(url, timeout=ACTION_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            print(f"Error loading agent: {e}")
+            return False
+
+        if response.status_code == 200:
+            _agent_loaded_at = time.monotonic()
+            return True
+        print(f"Error loading agent: {response.status_code}")
+        _agent_loaded_at = 0
+        return False
+
+
+def agent_not_loaded(response):
+    """Checks whether an action response reports that no agent is loaded on the server."""
+    return response.status_code == 400 and "agent loaded" in response.text.lower()
+
+
+def call_action(connection, action, params, timeout=ACTION_TIMEOUT, coalesce=True):
+    """
+    Calls a ZerePy agent action over the pooled session, loading the agent only when needed.
+
+    :param connection: ZerePy connection name (e.g. 'sonic', 'openai').
+    :param action: Action name on the connection.
+    :param params: List of action parameters.
+    :param timeout: Request timeout in seconds.
+    :param coalesce: Share the response with identical calls already in flight. Must be False
+                     for actions with side effects, such as swaps.
+    :return: The requests.Response, or None if the agent could not be loaded.
+    """
+    payload = {
+        "connection": connection,
+        "action": action,
+        "params": params
+    }
+
+    if not coalesce:
+        return _post_action(payload, timeout)
+
+    key = json.dumps([connection, action, params], sort_keys=True, default=str)
+    return action_flights.do(key, lambda: _post_action(payload, timeout))
+
+
+def _post_action(payload, timeout):
+    if not load_agent():
+        return None
+
+    response = get_session().post(ZEREPY_API_URL, json=payload, timeout=timeout)
+
+    # The server restarted or dropped the agent since our last load
+    if agent_not_loaded(response):
+        if not load_agent(force=True):
+            return None
+        response = get_session().post(ZEREPY_API_URL, json=payload, timeout=timeout)
+
+    return response
@@ -0,0 +1,9 @@
+import sys
+from core.user_activity import ensure_indexes, rollup_activity
+
+if __name__ == "__main__":
+    # Run daily from the scheduler; pass a number of days to backfill a longer period
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    ensure_indexes()
+    rollup_activity(days)
+    print(f"Rolled up user activity for the last {days} days.")
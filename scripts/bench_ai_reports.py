@@ -0,0 +1,91 @@
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from openai import OpenAI
+from assessment.agent_choice import project_list
+from scripts import push_report_to_db
+
+# Simulated generation latency (seconds) and share of requests answered with a 503
+LATENCY = 2.0
+FAILURE_RATE = 0.2
+
+
+def make_handler(latency, failure_rate, rng):
+    """OpenAI-compatible chat completions stand-in with fixed latency and random transient failures."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(latency)
+            if rng.random() < failure_rate:
+                status, payload = 503, {"error": {"message": "Service unavailable", "type": "server_error"}}
+            else:
+                status, payload = 200, {
+                    "id": "bench", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": f"Report ({len(body['messages'][1]['content'])} chars)"}}]
+                }
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def synthetic_stats(projects, deadline=None):
+    """
+    Synthetic dashboard stats, so the bench measures the generation pipeline only. TVL figures
+    drift slightly on every call, as they do between DeFi Llama ingestions. Every other project
+    uses the placeholders dashboard_stats returns when data is missing.
+    """
+    return {name: {
+        "auditSecurityScore": {"project_name": project, "total_score": 70, "audited_by": ["Bench"]},
+        "pastHacks": {},
+        "tvlMetrics": {
+            "totalTvl": 1234567.89 * random.uniform(0.999, 1.001),
+            "avgApy": round(5.12 * random.uniform(0.999, 1.001), 2),
+            "predictedProbability": round(61.3 * random.uniform(0.999, 1.001), 2),
+            "impermanentLossRisk": 0,
+            "numPools": 3
+        }
+    } if i % 2 else {
+        "auditSecurityScore": 0,
+        "pastHacks": "NA",
+        "tvlMetrics": "NA"
+    } for i, (name, (project, _)) in enumerate(projects.items())}
+
+
+def run(concurrency):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(LATENCY, FAILURE_RATE, random.Random(concurrency)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    llm = OpenAI(api_key="bench", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", max_retries=0)
+    collection = push_report_to_db.db["aiReportsBench"]
+    collection.drop()
+
+    push_report_to_db.dashboard_stats_many = synthetic_stats
+    push_report_to_db.REPORT_CONCURRENCY = concurrency
+    push_report_to_db.BACKOFF_BASE = 0.1
+
+    for label in ["cold", "unchanged"]:
+        started = time.perf_counter()
+        outcome = push_report_to_db.push_all_reports(project_list, collection=collection, llm=llm)
+        elapsed = time.perf_counter() - started
+        print(f"concurrency {concurrency:>2}  {label:<9}  {elapsed:6.2f}s  "
+              f"updated {sum(1 for s in outcome.values() if s == 'updated')}  "
+              f"documents {collection.count_documents({})}\n")
+
+    collection.drop()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    for concurrency in [int(arg) for arg in sys.argv[1:]] or [1, 4, 10]:
+        run(concurrency)
@@ -0,0 +1,53 @@
+import random
+import sys
+import time
+from core.optimise_portfolio import plan_rebalance
+
+TOP_N = 3
+RUNS = 20
+
+
+def synthetic_portfolio(size, rng):
+    """Random portfolio of `size` tokens with scores in 0-100 and holdings summing to 100%."""
+    weights = [rng.random() for _ in range(size)]
+    total = sum(weights)
+    return [{
+        "name": f"Token {i}",
+        "symbol": f"TK{i}",
+        "contract_address": f"0x{i:040x}",
+        "balance": rng.uniform(1, 10000),
+        "holding_percent": 100 * weight / total,
+        "auditSecurityScore": {"total_score": rng.uniform(0, 100)}
+    } for i, weight in enumerate(weights)]
+
+
+def legacy_swap_count(tokens, target_security_score):
+    """Swaps the previous strategy issued: one per token scoring below the target."""
+    return sum(1 for token in tokens if token["auditSecurityScore"]["total_score"] < target_security_score)
+
+
+def run(size, rng):
+    elapsed = 0
+    planned = legacy = 0
+    for _ in range(RUNS):
+        tokens = synthetic_portfolio(size, rng)
+        current = sum(t["holding_percent"] / 100 * t["auditSecurityScore"]["total_score"] for t in tokens)
+        target = min(current + 10, 85)
+
+        started = time.perf_counter()
+        plan = plan_rebalance(tokens, target, TOP_N)
+        elapsed += time.perf_counter() - started
+
+        if plan["status"] == "success":
+            planned += len(plan["swaps"])
+            legacy += legacy_swap_count(tokens, target)
+
+    print(f"{size:>5} tokens  {1000 * elapsed / RUNS:8.2f} ms/plan  "
+          f"swaps {planned / RUNS:7.1f} vs legacy {legacy / RUNS:7.1f}  "
+          f"avoided {(legacy - planned) / RUNS:7.1f}")
+
+
+if __name__ == "__main__":
+    rng = random.Random(7)
+    for size in [int(arg) for arg in sys.argv[1:]] or [10, 100, 1000]:
+        run(size, rng)
@@ -0,0 +1,141 @@
+import concurrent.futures
+import datetime
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from core import swap_executor, zerepy_client
+
+# Simulated swap latency (seconds)
+LATENCY = 0.2
+
+PRIVATE_KEY = "0x" + "11" * 32
+
+
+class ZerePyStub:
+    """Local stand-in for the ZerePy agent API, recording every swap it receives."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.swaps = []
+        self.fail = set()  # from_contract values answered with a 500
+        self.hang = set()  # from_contract values answered after the client timed out
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                status = 200
+                if self.path == "/agent/action":
+                    params = json.loads(body)["params"]
+                    stub.swaps.append(params)
+                    time.sleep(stub.latency * (20 if params[1] in stub.hang else 1))
+                    status = 500 if params[1] in stub.fail else 200
+                data = json.dumps({"status": "success" if status == 200 else "error"}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+
+def plan(size):
+    """Synthetic rebalance plan of `size` swaps."""
+    return {"tokens": [], "swaps": [{
+        "from_symbol": f"TK{i}", "to_symbol": "SAFE",
+        "from_contract": f"0x{i:040x}", "to_contract": "0x" + "ff" * 20, "amount": 1.0
+    } for i in range(size)]}
+
+
+def statuses(run):
+    return " ".join(swap["status"] for swap in run["swaps"])
+
+
+def check(label, condition):
+    print(f"{'ok  ' if condition else 'FAIL'}  {label}")
+    return condition
+
+
+def run(size):
+    stub = ZerePyStub(LATENCY)
+    zerepy_client.ZEREPY_BASE_URL = stub.url
+    zerepy_client.ZEREPY_API_URL = f"{stub.url}/agent/action"
+    swap_executor.executed_swaps = swap_executor.db["executedSwapsBench"]
+    swap_executor.executed_swaps.drop()
+    results = []
+
+    # A failing swap stops the run and blocks the rest, which a resume then sends
+    stub.fail = {plan(size)["swaps"][1]["from_contract"]}
+    started = time.perf_counter()
+    swap_run = swap_executor.run_swaps(swap_executor.create_swap_run("0xbench", None, [], plan(size)), PRIVATE_KEY)
+    elapsed = time.perf_counter() - started
+    print(f"{size} swaps  {elapsed:5.2f}s  {statuses(swap_run)}")
+    results.append(check("run stops at the failed swap", swap_run["status"] == "partial" and stub.swaps and len(stub.swaps) == 2))
+    results.append(check("no nonce is passed to the swap action", all(len(params) == 4 for params in stub.swaps)))
+
+    # Two concurrent resumes: only one claims the run
+    stub.fail = set()
+    sent = len(stub.swaps)
+    with concurrent.futures.ThreadPoolExecutor(2) as pool:
+        claims = list(pool.map(lambda _: swap_executor.claim_swap_run(swap_run["_id"], "0xbench"), range(2)))
+    claimed = [claim for claim in claims if claim]
+    results.append(check("only one concurrent resume claims the run", len(claimed) == 1))
+    swap_run = swap_executor.run_swaps(claimed[0], PRIVATE_KEY)
+    print(f"resumed  {statuses(swap_run)}")
+    results.append(check("resume sends only the unfinished swaps", swap_run["status"] == "completed" and len(stub.swaps) - sent == size - 1))
+    results.append(check("a completed run cannot be claimed", swap_executor.claim_swap_run(swap_run["_id"], "0xbench") is None))
+
+    # A swap the server does not answer for in time is never resent
+    stub.hang = {plan(size)["swaps"][0]["from_contract"]}
+    swap_executor.SWAP_TIMEOUT = LATENCY * 5
+    swap_run = swap_executor.run_swaps(swap_executor.create_swap_run("0xbench", None, [], plan(size)), PRIVATE_KEY)
+    print(f"timeout  {statuses(swap_run)}")
+    results.append(check("an unanswered swap is unconfirmed", swap_run["swaps"][0]["status"] == "unconfirmed"))
+    sent = len(stub.swaps)
+    swap_run = swap_executor.run_swaps(swap_executor.claim_swap_run(swap_run["_id"], "0xbench"), PRIVATE_KEY)
+    results.append(check("resume skips the unconfirmed swap", len(stub.swaps) - sent == size - 1 and swap_run["status"] == "unconfirmed"))
+
+    # A running run whose executor died mid-swap is taken over once its lease expires
+    stub.hang = set()
+    swap_run = swap_executor.create_swap_run("0xbench", None, [], plan(size))
+    stale = datetime.datetime.utcnow() - datetime.timedelta(seconds=swap_executor.SWAP_RUN_LEASE + 1)
+    swap_executor.executed_swaps.update_one(
+        {"_id": swap_run["_id"]}, {"$set": {"swaps.0.status": "submitted", "updated_at": stale}}
+    )
+    results.append(check("a live run cannot be claimed", swap_executor.claim_swap_run(
+        swap_executor.create_swap_run("0xbench", None, [], plan(size))["_id"], "0xbench") is None))
+    claimed = swap_executor.claim_swap_run(swap_run["_id"], "0xbench")
+    results.append(check("a stale running run is taken over", claimed is not None and claimed["swaps"][0]["status"] == "unconfirmed"))
+    sent = len(stub.swaps)
+    try:
+        swap_executor.run_swaps(swap_run, PRIVATE_KEY)
+        lost = False
+    except swap_executor.LeaseLost:
+        lost = True
+    results.append(check("the previous executor stops without sending", lost and len(stub.swaps) == sent))
+
+    # Background execution returns at once and the run is polled for progress
+    started = time.perf_counter()
+    swap_run = swap_executor.create_swap_run("0xbench", None, [], plan(size))
+    future = swap_executor.start_swap_run(swap_run, PRIVATE_KEY)
+    queued = time.perf_counter() - started
+    while swap_executor.get_swap_run(swap_run["_id"], "0xbench")["status"] == "running":
+        time.sleep(LATENCY / 2)
+    print(f"background  started in {1000 * queued:.1f} ms, finished in {time.perf_counter() - started:.2f}s")
+    results.append(check("a background run completes", future.result()["status"] == "completed" and queued < LATENCY))
+
+    swap_executor.executed_swaps.drop()
+    stub.server.shutdown()
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run(int(sys.argv[1]) if len(sys.argv) > 1 else 6) else 1)
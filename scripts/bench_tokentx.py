@@ -0,0 +1,82 @@
+import json
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from core import fetch_user_tokens
+
+WALLET = "0x000000000000000000000000000000000000beef"
+TOKEN_COUNT = 30
+TRANSFERS_PER_BLOCK = 3
+
+
+def synthetic_transfer(i):
+    """Deterministic tokentx row number i: alternating receives and smaller sends across TOKEN_COUNT tokens."""
+    contract = f"0x{(i % TOKEN_COUNT) + 1:040x}"
+    counterparty = f"0x{0xc0ffee + i:040x}"
+    receive = i % 4 != 3
+    return {
+        "blockNumber": str(1 + i // TRANSFERS_PER_BLOCK),
+        "hash": f"0x{i:064x}",
+        "from": counterparty if receive else WALLET,
+        "to": WALLET if receive else counterparty,
+        "contractAddress": contract,
+        "tokenName": f"Token {i % TOKEN_COUNT}",
+        "tokenSymbol": f"TK{i % TOKEN_COUNT}",
+        "tokenDecimal": "18",
+        "value": str((10 if receive else 1) * 10 ** 18)
+    }
+
+
+def make_handler(total):
+    """Explorer stand-in serving `total` transfers with the real API's paging and result window."""
+    first_index = lambda block: max(0, (block - 1) * TRANSFERS_PER_BLOCK)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(self.path).query))
+            page, offset = int(query["page"]), int(query["offset"])
+            if page * offset > fetch_user_tokens.EXPLORER_RESULT_WINDOW:
+                body = {"status": "0", "message": "Result window is too large", "result": []}
+            else:
+                start = first_index(int(query["startblock"])) + (page - 1) * offset
+                rows = [synthetic_transfer(i) for i in range(start, min(start + offset, total))]
+                body = {"status": "1", "message": "OK", "result": rows} if rows else \
+                    {"status": "0", "message": "No transactions found", "result": []}
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def run(total):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(total))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    fetch_user_tokens.CHAIN_API_BASE_URLS["bench"] = f"http://127.0.0.1:{server.server_address[1]}/api"
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    holdings = fetch_user_tokens.get_tokens_held("bench", WALLET, "bench")
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    server.shutdown()
+
+    expected = sum(10 if i % 4 != 3 else -1 for i in range(total) if i % TOKEN_COUNT == 0)
+    print(f"{total:>8} transfers  {elapsed:7.2f}s  {total / elapsed:>9,.0f} rows/s  "
+          f"peak {peak / 2 ** 20:6.1f} MiB  tokens {len(holdings)}  "
+          f"TK0 balance {'ok' if holdings[0]['balance'] == expected else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    for total in [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]:
+        run(total)
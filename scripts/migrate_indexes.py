@@ -0,0 +1,48 @@
+import sys
+from utils.db_schema import check_queries, db, enable_profiling, ensure_indexes, slow_queries
+
+# Operations slower than this (milliseconds) are profiled and reported
+SLOW_MS = 100
+
+
+def dedupe_ai_reports():
+    """Keeps only the newest report per project, which the unique project index requires."""
+    duplicates = db.aiReports.aggregate([
+        {"$sort": {"project": 1, "createdAt": -1}},
+        {"$group": {"_id": "$project", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ])
+    removed = 0
+    for group in duplicates:
+        removed += db.aiReports.delete_many({"_id": {"$in": group["ids"][1:]}}).deleted_count
+    return removed
+
+
+def migrate():
+    """Applies the declared indexes and confirms the hot queries use them."""
+    print(f"Removed {dedupe_ai_reports()} superseded aiReports.")
+
+    for name, error in ensure_indexes().items():
+        print(f"Index creation failed for {name}: {error}")
+
+    unindexed = 0
+    for result in check_queries():
+        unindexed += not result["indexed"]
+        print(f"{'ok  ' if result['indexed'] else 'SCAN'} {result['collection']:<20} {result['filter']}  {' <- '.join(result['stages'])}")
+    print(f"{unindexed} hot queries without an index.")
+
+
+def report_slow_queries():
+    """Prints the slowest operations recorded by the profiler."""
+    for op in slow_queries(SLOW_MS):
+        print(f"{op['millis']:>7} ms  {op['op']:<8} {op['ns']:<40} {op['plan']}  examined {op['docsExamined']}")
+
+
+if __name__ == "__main__":
+    if "--profile" in sys.argv:
+        # Start recording slow operations; read them back later with --slow
+        enable_profiling(SLOW_MS)
+    if "--slow" in sys.argv:
+        report_slow_queries()
+    else:
+        migrate()
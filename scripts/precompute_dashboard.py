@@ -0,0 +1,56 @@
+import sys
+import time
+from assessment.agent_choice import project_list
+from assessment.calculation import dashboard_stats_many
+from core.dashboard_snapshots import SNAPSHOT_MAX_AGE, ensure_indexes, stale_projects, write_snapshot
+
+# Seconds between refresh passes
+REFRESH_INTERVAL = 60
+
+# Overall deadline for one pass of upstream fetches
+PASS_DEADLINE = 60
+
+
+def precompute_dashboard(max_age=SNAPSHOT_MAX_AGE):
+    """
+    Recomputes dashboard stats for every project in project_list whose snapshot is stale
+    and stores a new snapshot version for each.
+
+    :param max_age: Maximum snapshot age in seconds; 0 refreshes everything.
+    """
+    stale = stale_projects(project_list, max_age)
+    if not stale:
+        print("All dashboard snapshots are fresh.")
+        return
+
+    stats = dashboard_stats_many({name: (name, symbol) for name, symbol in stale.items()}, deadline=PASS_DEADLINE)
+
+    written = 0
+    for name, project_stats in stats.items():
+        # Keep serving the previous snapshot rather than overwrite it with a placeholder
+        if project_stats.get("timedOut"):
+            print(f"Skipping {name}: stats unavailable.")
+            continue
+        write_snapshot(name, project_stats)
+        written += 1
+
+    print(f"Stored {written} of {len(stale)} stale dashboard snapshots.")
+
+
+def run_worker():
+    """Refreshes stale snapshots forever, every REFRESH_INTERVAL seconds."""
+    while True:
+        try:
+            precompute_dashboard()
+        except Exception as e:
+            print("Error precomputing dashboard:", str(e))
+        time.sleep(REFRESH_INTERVAL)
+
+
+if __name__ == "__main__":
+    ensure_indexes()
+    if "--once" in sys.argv:
+        # Warm every snapshot, e.g. from the release phase of a deploy
+        precompute_dashboard(max_age=0)
+    else:
+        run_worker()
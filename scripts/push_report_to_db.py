@@ -1,37 +1,63 @@
-import uuid
-from assessment.agent_choice import fetch_complete_data
-from utils.db_client import client
-from openai import OpenAI
 import datetime
+import functools
+import hashlib
 import json
+import os
+import random
+import sys
+import time
+import uuid
+import openai
+from openai import OpenAI
+from pymongo import ReturnDocument
+from utils.db_client import client
+from utils.concurrency import fan_out
+from utils.markdown_cache import render_markdown
+from assessment.agent_choice import project_list
+from assessment.calculation import dashboard_stats_many
+from core.report_cache import bucket
 
-openai_client = OpenAI()
+# Retries are handled below with our own backoff; OPENAI_BASE_URL points the client at a local stub
+openai_client = OpenAI(max_retries=0)
 
 db = client["agentDatabase"]
 
-def push_report_to_db(project_name):
-    protocols_data = fetch_complete_data()  # Fetch stored DeFi data
+REPORT_MODEL = "gpt-4o"
+SYSTEM_PROMPT = "You are a DeFi security expert."
+
+# Generations in flight at once
+REPORT_CONCURRENCY = int(os.getenv("AI_REPORT_CONCURRENCY", 4))
+
+# Attempts per project, and the base delay (seconds) of the exponential backoff between them
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1
 
-    # Convert string to dictionary if needed
-    if isinstance(protocols_data, str):
-        protocols_data = json.loads(protocols_data)
+# Overall deadline for fetching the inputs of every project
+STATS_DEADLINE = 60
 
-    # Retrieve project data
-    protocol = protocols_data.get(project_name)
+# TVL metrics that move with every DeFi Llama ingestion; bucketed before hashing so a report
+# is only regenerated when they change materially
+VOLATILE_TVL_FIELDS = ["totalTvl", "avgApy", "predictedProbability"]
 
-    # Extract details with safe defaults
-    audit_security = protocol.get("auditSecurityScore", {})
-    past_hacks = protocol.get("pastHacks", {})
-    tvl_metrics = protocol.get("tvlMetrics", {})
+# Upstream failures worth another attempt
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError, openai.InternalServerError)
 
-    # Construct AI prompt
-    prompt = f"""
+
+def build_prompt(protocol):
+    """Builds the AI report prompt from a project's dashboard stats."""
+    # Extract details with safe defaults; dashboard_stats uses "NA"/0 placeholders for missing data
+    audit_security, past_hacks, tvl_metrics = (
+        value if isinstance(value, dict) else {}
+        for value in (protocol.get("auditSecurityScore"), protocol.get("pastHacks"), protocol.get("tvlMetrics"))
+    )
+
+    return f"""
     Analyze the following DeFi project and provide a security and risk assessment:
 
     **Project Name:** {audit_security.get("project_name", "Unknown")}
     **Audit Security Score:** {audit_security.get("total_score", "Not Available")}
     **Audited By:** {", ".join(audit_security.get("audited_by", [])) if audit_security.get("audited_by") else "None"}
-    **Past Hacks:** {json.dumps(past_hacks, indent=2)}
+    **Past Hacks:** {json.dumps(past_hacks, indent=2, sort_keys=True)}
 
     **Key Metrics:**
     - TVL (Total Value Locked): ${tvl_metrics.get("totalTvl", "Unknown")}
@@ -43,14 +69,101 @@ def push_report_to_db(project_name):
     Provide an expert-level risk analysis for users interacting with protocol including security insights, investment risks, and any other.
     If audits count is 0, you do not have data but it does not indicate that there are no audits done for the project.
     """
-    response = openai_client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "You are a DeFi security expert."},
-            {"role": "user", "content": prompt}
-        ]
+
+
+def input_hash(protocol):
+    """Hash of everything that determines a generated report, with volatile TVL figures bucketed."""
+    tvl_metrics = protocol.get("tvlMetrics")
+    if isinstance(tvl_metrics, dict):
+        tvl_metrics = {field: bucket(value) if field in VOLATILE_TVL_FIELDS else value for field, value in tvl_metrics.items()}
+        protocol = dict(protocol, tvlMetrics=tvl_metrics)
+    return hashlib.sha256(json.dumps([REPORT_MODEL, SYSTEM_PROMPT, build_prompt(protocol)]).encode()).hexdigest()
+
+
+def generate_report(prompt, llm=openai_client):
+    """
+    Generates a report, retrying transient upstream failures with exponential backoff and jitter.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            response = llm.chat.completions.create(
+                model=REPORT_MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ]
+            )
+            return response.choices[0].message.content
+        except RETRYABLE_ERRORS:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(BACKOFF_BASE * 2 ** attempt * (1 + random.random()))
+
+
+def push_report_to_db(project_name, protocol, collection=db.aiReports, force=False, llm=openai_client):
+    """
+    Regenerates a project's AI report unless its inputs are unchanged, keeping one report per project.
+
+    :param project_name: Name of the project.
+    :param protocol: Dashboard stats of the project.
+    :param collection: Collection holding the reports.
+    :param force: Regenerate even when the inputs are unchanged.
+    :return: "updated" or "unchanged".
+    """
+    inputs = input_hash(protocol)
+    if not force and collection.find_one({"project": project_name, "inputHash": inputs}, {"_id": 1}):
+        return "unchanged"
+
+    ai_report = generate_report(build_prompt(protocol), llm)
+
+    report = collection.find_one_and_update(
+        {"project": project_name},
+        {
+            "$set": {
+                "aiReport": ai_report,
+                # Rendered once here so report views skip markdown parsing
+                "aiReportHtml": render_markdown(ai_report),
+                "inputHash": inputs,
+                "createdAt": datetime.datetime.utcnow()
+            },
+            "$setOnInsert": {"_id": uuid.uuid4().hex}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
     )
-    ai_report = response.choices[0].message.content
+    # Earlier runs inserted a new document per generation
+    collection.delete_many({"project": project_name, "_id": {"$ne": report["_id"]}})
+    return "updated"
+
+
+def push_all_reports(projects=project_list, collection=db.aiReports, force=False, llm=openai_client):
+    """
+    Regenerates the AI reports of every project with bounded concurrency.
+
+    :param projects: Dictionary of project name -> symbol.
+    :return: Dictionary of project name -> "updated", "unchanged" or the error that stopped it.
+    """
+    started = time.perf_counter()
+    stats = dashboard_stats_many({name: (name, symbol) for name, symbol in projects.items()}, deadline=STATS_DEADLINE)
+    outcome = {name: "stats unavailable" for name, protocol in stats.items() if protocol.get("timedOut")}
+
+    calls = {
+        name: functools.partial(push_report_to_db, name, protocol, collection, force, llm)
+        for name, protocol in stats.items() if name not in outcome
+    }
+    batch = fan_out(calls, max_workers=REPORT_CONCURRENCY, deadline=None)
+    outcome.update(batch["results"])
+    outcome.update({name: f"failed: {error}" for name, error in batch["errors"].items()})
+
+    for name in projects:
+        print(f"{name:<24} {outcome[name]}")
+    updated = sum(1 for status in outcome.values() if status == "updated")
+    print(f"{updated} of {len(projects)} reports regenerated in {time.perf_counter() - started:.1f}s.")
+    return outcome
 
-    db.aiReports.insert_one({"_id":uuid.uuid4().hex,"aiReport":ai_report,"project":project_name,"createdAt":datetime.datetime.utcnow()})
 
+if __name__ == "__main__":
+    # Optional project names restrict the batch; --force ignores unchanged inputs
+    names = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    selected = {name: project_list[name] for name in names} if names else project_list
+    push_all_reports(selected, force="--force" in sys.argv)
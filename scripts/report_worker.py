@@ -0,0 +1,48 @@
+import os
+import socket
+import threading
+import time
+from core.report_cache import ensure_indexes as ensure_cache_indexes
+from core.report_jobs import claim_job, ensure_indexes, fail_abandoned_jobs, run_job
+
+# Report generations processed concurrently by this process
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", 4))
+
+# Seconds an idle worker waits before polling the queue again
+POLL_INTERVAL = 1
+
+
+def work(worker_id):
+    """Claims and runs report jobs forever."""
+    while True:
+        try:
+            job = claim_job(worker_id)
+            if job is None:
+                # Idle workers also settle jobs abandoned on their last attempt
+                abandoned = fail_abandoned_jobs()
+                if abandoned:
+                    print(f"[{worker_id}] Failed {abandoned} abandoned report jobs")
+                time.sleep(POLL_INTERVAL)
+                continue
+            started = time.perf_counter()
+            job = run_job(job)
+            print(f"[{worker_id}] {job['protocol']}: {job['status']}{' (cached)' if job.get('cached') else ''} in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            print(f"[{worker_id}] Error processing report job:", str(e))
+            time.sleep(POLL_INTERVAL)
+
+
+def run_workers(count=REPORT_WORKERS):
+    """Starts `count` worker threads; generations are I/O bound, so threads are enough."""
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    threads = [threading.Thread(target=work, args=(f"{prefix}-{i}",), daemon=True) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    ensure_indexes()
+    ensure_cache_indexes()
+    run_workers()
@@ -1,38 +1,138 @@
+import datetime
+import hashlib
+import json
 import requests
+from pymongo import UpdateOne
 from utils.db_client import client
-import uuid
+from core.fetch_tvl import ensure_indexes, normalize_symbols, refresh_symbol_metrics
+from core.tvl_history import ensure_collections, history_point, record_points, rollup_daily
 
 db=client["agentDatabase"]
 
 # API URL for fetching TVL data
 API_URL = "https://yields.llama.fi/pools"
 
+# Pools per bulk_write round trip
+BATCH_SIZE = 500
+
+# Bytes read from the response per chunk
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_array_items(chunks, key):
+    """
+    Incrementally decodes the items of the top-level JSON array stored under `key`, keeping only
+    one chunk and the item being decoded in memory.
+
+    :param chunks: Iterable of text chunks forming one JSON document.
+    :param key: Name of the top-level key holding the array.
+    :return: Generator of decoded array items.
+    :raises ValueError: If the chunks end before the array is closed.
+    """
+    decoder = json.JSONDecoder()
+    marker = f'"{key}"'
+    buffer = ""
+    in_array = False
+
+    for chunk in chunks:
+        buffer += chunk
+        if not in_array:
+            start = buffer.find(marker)
+            bracket = buffer.find("[", start + len(marker)) if start != -1 else -1
+            if bracket == -1:
+                # Keep the marker, or enough of the tail to match one split across chunks
+                buffer = buffer[start:] if start != -1 else buffer[-len(marker):]
+                continue
+            buffer = buffer[bracket + 1:]
+            in_array = True
+
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                item, position_after = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The item continues in the next chunk
+                break
+            yield item
+            position = position_after
+        buffer = buffer[position:]
+
+    # A truncated response must not pass for a complete feed
+    raise ValueError(f'Response ended before the "{key}" array was closed')
+
+
+def content_hash(pool):
+    """Stable hash of a pool's fields, used to skip writes for unchanged pools."""
+    return hashlib.sha256(json.dumps(pool, sort_keys=True, default=str).encode()).hexdigest()
+
 
 def fetch_sonic_tvl():
     """
-    Fetches TVL data from DeFi Llama and filters Sonic chain pools.
+    Streams TVL data from DeFi Llama and upserts Sonic chain pools keyed on their pool id.
     """
     try:
-        response = requests.get(API_URL, headers={"accept": "*/*"})
-        if response.status_code == 200:
-            data = response.json()["data"]
+        response = requests.get(API_URL, headers={"accept": "*/*"}, stream=True)
+        if response.status_code != 200:
+            print(f"Failed to fetch data. Status Code: {response.status_code}")
+            return
+
+        # Hashes of the stored pools, so unchanged pools cost no write
+        stored_hashes = {doc["_id"]: doc.get("contentHash") for doc in db.tvlSonicProjects.find({}, {"contentHash": 1})}
 
+        seen_ids = set()
+        written = 0
+        batch = []
+        points = []
+        ingested_at = datetime.datetime.utcnow()
+        response.encoding = response.encoding or "utf-8"
+        for pool in iter_array_items(response.iter_content(CHUNK_SIZE, decode_unicode=True), "data"):
             # Filter for Sonic chain pools
-            sonic_pools = [pool for pool in data if pool.get("chain") == "Sonic"]
+            if pool.get("chain") != "Sonic" or not pool.get("pool"):
+                continue
+            seen_ids.add(pool["pool"])
 
-            if not sonic_pools:
-                print("No Sonic pools found.")
-                return
+            # Every run records a history point, even for unchanged pools
+            points.append(history_point(pool, ingested_at))
 
-            for pool in sonic_pools:
-                pool["_id"] = str(uuid.uuid4().hex)  # Assign unique UUID
-                db.tvlSonicProjects.update_one({"_id": pool["_id"]}, {"$set": pool}, upsert=True)
+            # Normalized token symbols back the indexed per-symbol aggregation
+            pool["symbols"] = normalize_symbols(pool.get("symbol"))
+            pool["contentHash"] = content_hash(pool)
+            if stored_hashes.get(pool["pool"]) == pool["contentHash"]:
+                continue
+            pool["_id"] = pool["pool"]
+            batch.append(UpdateOne({"_id": pool["_id"]}, {"$set": pool}, upsert=True))
 
-            print(f"Inserted {len(sonic_pools)} Sonic pools into MongoDB.")
+            if len(batch) >= BATCH_SIZE:
+                db.tvlSonicProjects.bulk_write(batch, ordered=False)
+                written += len(batch)
+                batch = []
 
-        else:
-            print(f"Failed to fetch data. Status Code: {response.status_code}")
+        if batch:
+            db.tvlSonicProjects.bulk_write(batch, ordered=False)
+            written += len(batch)
 
-    except requests.exceptions.RequestException as e:
-        print("Error fetching TVL data:", str(e))
+        seen = len(seen_ids)
+        if not seen:
+            # An empty or truncated feed must not wipe the stored pools
+            print("No Sonic pools found.")
+            return
 
+        # Drop pools that left the feed, and documents from earlier runs stored under random ids,
+        # so their last TVL stops counting towards the symbol metrics
+        removed = db.tvlSonicProjects.delete_many({"_id": {"$nin": list(seen_ids)}}).deleted_count
+
+        ensure_indexes()
+        refresh_symbol_metrics()
+
+        ensure_collections()
+        record_points(points)
+        rollup_daily()
+
+        print(f"Processed {seen} Sonic pools: {written} written, {seen - written} unchanged, {removed} stale pools removed.")
+
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print("Error fetching TVL data:", str(e))
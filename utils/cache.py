@@ -0,0 +1,128 @@
+import collections
+import concurrent.futures
+import functools
+import threading
+import time
+
+# Shared pool for background refreshes so a burst of stale reads cannot spawn unbounded threads
+_refresh_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+
+def is_error_result(value):
+    """Checks whether a fetch result is an error/default payload that should be negatively cached."""
+    if not isinstance(value, dict):
+        return True
+    return "error" in value or value.get("default_used", False) or value.get("status") == "error"
+
+
+class TTLCache:
+    """
+    LRU cache with per-entry TTL and stale-while-revalidate.
+
+    Fresh entries are served directly. Expired entries keep being served while a single
+    background refresh replaces them, so callers never wait on a refresh. Error results
+    are kept only for negative_ttl, and never overwrite a previous good value.
+    """
+
+    def __init__(self, ttl, negative_ttl=10, maxsize=256, max_stale=None, is_error=is_error_result):
+        """
+        :param ttl: Seconds a good result stays fresh.
+        :param negative_ttl: Seconds an error result stays fresh.
+        :param maxsize: Maximum number of entries before least recently used ones are evicted.
+        :param max_stale: Seconds past expiry after which a stale entry is reloaded synchronously
+                          instead of being served (None serves stale entries indefinitely).
+        :param is_error: Callable deciding whether a result is an error.
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.max_stale = max_stale
+        self.is_error = is_error
+        self._entries = collections.OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get(self, key, loader):
+        """
+        Returns the cached value for key, loading it with loader() on a miss.
+
+        :param key: Hashable cache key.
+        :param loader: Zero-argument callable producing the value.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                self._entries.move_to_end(key)
+                if now < expires_at:
+                    self.hits += 1
+                    return value
+                if self.max_stale is None or now - expires_at < self.max_stale:
+                    self.stale += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        _refresh_executor.submit(self._refresh, key, loader)
+                    return value
+            self.misses += 1
+
+        value = loader()
+        self._store(key, value)
+        return value
+
+    def _refresh(self, key, loader):
+        try:
+            self._store(key, loader())
+        except Exception as e:
+            print(f"Background refresh failed for {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key, value):
+        now = time.monotonic()
+        with self._lock:
+            if self.is_error(value):
+                previous = self._entries.get(key)
+                if previous is not None and not self.is_error(previous[0]):
+                    # Keep serving the last good value, but retry soon
+                    value = previous[0]
+                self._entries[key] = (value, now + self.negative_ttl)
+            else:
+                self._entries[key] = (value, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drops one entry, or every entry when key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """Returns hit, miss and stale counters along with the current size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "stale": self.stale, "size": len(self._entries)}
+
+
+def ttl_cache(ttl, negative_ttl=10, maxsize=256, max_stale=None):
+    """
+    Decorator caching a function's results in a TTLCache keyed on its positional arguments.
+    The cache is exposed as the wrapper's `cache` attribute.
+    """
+    def decorator(fn):
+        cache = TTLCache(ttl, negative_ttl=negative_ttl, maxsize=maxsize, max_stale=max_stale)
+
+        @functools.wraps(fn)
+        def wrapper(*args):
+            return cache.get(args, functools.partial(fn, *args))
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
@@ -0,0 +1,96 @@
+import concurrent.futures
+import threading
+
+# Upper bound on concurrent upstream calls per fan-out
+DEFAULT_MAX_WORKERS = 8
+
+# Overall deadline (seconds) for a fan-out before partial results are returned
+DEFAULT_DEADLINE = 8
+
+
+def fan_out(calls, max_workers=DEFAULT_MAX_WORKERS, deadline=DEFAULT_DEADLINE):
+    """
+    Runs independent calls concurrently on a bounded thread pool under one overall deadline.
+
+    :param calls: Dictionary of key -> zero-argument callable (e.g. functools.partial).
+    :param max_workers: Maximum number of calls running at the same time.
+    :param deadline: Seconds to wait for all calls, or None to wait for every call.
+    :return: Dictionary with "results" (key -> return value), "errors" (key -> exception)
+             and "timed_out" (keys that did not finish before the deadline).
+    """
+    outcome = {"results": {}, "errors": {}, "timed_out": []}
+    if not calls:
+        return outcome
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(calls)))
+    try:
+        futures = {executor.submit(call): key for key, call in calls.items()}
+        done, not_done = concurrent.futures.wait(futures, timeout=deadline)
+
+        for future in done:
+            key = futures[future]
+            error = future.exception()
+            if error is not None:
+                outcome["errors"][key] = error
+            else:
+                outcome["results"][key] = future.result()
+
+        outcome["timed_out"] = [futures[future] for future in not_done]
+    finally:
+        # Do not block on stragglers; their results are discarded once the deadline passed
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return outcome
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the call and every
+    caller that arrives while it is in flight waits for and shares the same result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.calls = 0
+        self.suppressed = 0
+
+    def do(self, key, fn):
+        """
+        Runs fn() once for all concurrent callers of key.
+
+        :param key: Hashable key identifying identical calls.
+        :param fn: Zero-argument callable performing the call.
+        :return: The shared return value; a raised exception is re-raised in every caller.
+        """
+        with self._lock:
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                self.suppressed += 1
+                leader = False
+            else:
+                flight = {"done": threading.Event(), "result": None, "error": None}
+                self._in_flight[key] = flight
+                self.calls += 1
+                leader = True
+
+        if leader:
+            try:
+                flight["result"] = fn()
+            except BaseException as e:
+                flight["error"] = e
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+                flight["done"].set()
+        else:
+            flight["done"].wait()
+
+        if flight["error"] is not None:
+            raise flight["error"]
+        return flight["result"]
+
+    def stats(self):
+        """Returns how many calls were made upstream and how many duplicates were suppressed."""
+        with self._lock:
+            return {"calls": self.calls, "suppressed": self.suppressed, "in_flight": len(self._in_flight)}
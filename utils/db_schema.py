@@ -0,0 +1,140 @@
+import pymongo
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+from utils.db_client import client
+
+db = client["agentDatabase"]
+
+# Indexes of the collections queried directly by app.py. Collections owned by a core module
+# declare theirs in that module's ensure function, which ensure_indexes() runs as well.
+INDEXES = {
+    "users_sonic": [
+        IndexModel([("wallet_address", pymongo.ASCENDING)], unique=True, name="wallet_address_unique")
+    ],
+    "reports": [
+        IndexModel([("userId", pymongo.ASCENDING), ("createdAt", pymongo.DESCENDING)], name="userId_createdAt")
+    ],
+    "agent_flows": [
+        # Lookups by _id + user_id are served by the _id index
+        IndexModel([("user_id", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)], name="user_id_created_at")
+    ],
+    "executed_swaps": [
+        IndexModel([("user_id", pymongo.ASCENDING), ("executed_at", pymongo.DESCENDING)], name="user_id_executed_at")
+    ],
+    "aiReports": [
+        IndexModel([("project", pymongo.ASCENDING)], unique=True, name="project_unique")
+    ],
+    # Flask-Session looks sessions up by "id" and adds its own TTL index on "expiration"
+    "sessions": [
+        IndexModel([("id", pymongo.ASCENDING)], unique=True, name="id_unique")
+    ]
+}
+
+# Representative filters of the hot queries, checked with explain() after a migration
+HOT_QUERIES = [
+    ("users_sonic", {"wallet_address": "0x0"}),
+    ("reports", {"userId": "0x0"}),
+    ("agent_flows", {"user_id": "0x0"}),
+    ("agent_flows", {"_id": "0", "user_id": "0x0"}),
+    ("executed_swaps", {"user_id": "0x0"}),
+    ("executed_swaps", {"_id": "0", "user_id": "0x0"}),
+    ("aiReports", {"project": "Unknown"}),
+    ("sessions", {"id": "0"}),
+    ("dashboardSnapshots", {"project": {"$in": ["Unknown"]}}),
+    ("reportJobs", {"status": "queued"}),
+    ("tvlSonicProjects", {"symbols": "UNKNOWN"})
+]
+
+
+def module_ensure_functions():
+    """Index bootstrap functions of the collections owned by core modules."""
+    # Imported here because these modules import utils in turn
+    from core import (
+        dashboard_snapshots, fetch_cmc_data, fetch_tvl, payment_verifier, report_cache, report_jobs, tvl_history, user_activity
+    )
+    return [
+        dashboard_snapshots.ensure_indexes,
+        fetch_cmc_data.ensure_indexes,
+        fetch_tvl.ensure_indexes,
+        payment_verifier.ensure_indexes,
+        report_cache.ensure_indexes,
+        report_jobs.ensure_indexes,
+        tvl_history.ensure_collections,
+        user_activity.ensure_indexes
+    ]
+
+
+def ensure_indexes():
+    """
+    Creates every declared index. Safe to run repeatedly: existing indexes are left as they are.
+
+    :return: Dictionary of collection or function name -> error message, for the ones that failed.
+    """
+    errors = {}
+    for name, indexes in INDEXES.items():
+        try:
+            db[name].create_indexes(indexes)
+        except OperationFailure as e:
+            # e.g. duplicates blocking a unique index; the other collections still get theirs
+            errors[name] = str(e)
+    for ensure in module_ensure_functions():
+        try:
+            ensure()
+        except OperationFailure as e:
+            errors[f"{ensure.__module__}.{ensure.__name__}"] = str(e)
+    return errors
+
+
+def plan_stages(plan):
+    """Flattens the stage names of a query plan tree."""
+    stages = [plan.get("stage")]
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            stages += plan_stages(child)
+    return stages
+
+
+def check_queries(queries=HOT_QUERIES):
+    """
+    Explains every hot query and reports whether its winning plan uses an index.
+
+    :return: List of dicts with "collection", "filter", "stages" and "indexed".
+    """
+    results = []
+    for name, query in queries:
+        explain = db[name].find(query).explain()
+        winning = explain["queryPlanner"]["winningPlan"]
+        # Plans of sharded or time-series collections nest the tree one level down
+        stages = plan_stages(winning.get("queryPlan", winning))
+        results.append({
+            "collection": name,
+            "filter": query,
+            "stages": stages,
+            "indexed": "COLLSCAN" not in stages
+        })
+    return results
+
+
+def enable_profiling(slow_ms=100):
+    """Records operations slower than slow_ms in system.profile."""
+    db.command("profile", 1, slowms=slow_ms)
+
+
+def slow_queries(min_ms=100, limit=20):
+    """
+    Lists the slowest recent operations recorded by the profiler.
+
+    :return: List of dicts with "ns", "op", "millis", "plan", "docsExamined" and "ts".
+    """
+    cursor = db["system.profile"].find(
+        {"millis": {"$gte": min_ms}},
+        {"ns": 1, "op": 1, "millis": 1, "planSummary": 1, "docsExamined": 1, "ts": 1}
+    ).sort("millis", pymongo.DESCENDING).limit(limit)
+    return [{
+        "ns": op.get("ns"),
+        "op": op.get("op"),
+        "millis": op.get("millis"),
+        "plan": op.get("planSummary"),
+        "docsExamined": op.get("docsExamined"),
+        "ts": op.get("ts")
+    } for op in cursor]
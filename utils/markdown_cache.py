@@ -0,0 +1,61 @@
+import collections
+import hashlib
+import os
+import threading
+import markdown2
+
+# Rendered documents kept in memory per process
+MARKDOWN_CACHE_SIZE = 128
+
+_lock = threading.Lock()
+_rendered = collections.OrderedDict()  # content hash -> html, least recently used first
+_files = {}  # path -> (mtime_ns, size, content hash)
+
+
+def content_hash(text):
+    """Hash identifying a markdown document by its content."""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def render_markdown(text):
+    """
+    Converts markdown to HTML, reusing the result for content rendered before.
+
+    :param text: Markdown source.
+    :return: Rendered HTML.
+    """
+    key = content_hash(text)
+    with _lock:
+        if key in _rendered:
+            _rendered.move_to_end(key)
+            return _rendered[key]
+
+    html = markdown2.markdown(text)
+    with _lock:
+        _rendered[key] = html
+        while len(_rendered) > MARKDOWN_CACHE_SIZE:
+            _rendered.popitem(last=False)
+    return html
+
+
+def render_markdown_file(filepath):
+    """
+    Converts a markdown file to HTML. The file is only read again when its mtime or size
+    changes, and only re-rendered when its content changes.
+
+    :param filepath: Path of the markdown file.
+    :return: Rendered HTML.
+    """
+    stat = os.stat(filepath)
+    with _lock:
+        known = _files.get(filepath)
+        if known and known[:2] == (stat.st_mtime_ns, stat.st_size) and known[2] in _rendered:
+            _rendered.move_to_end(known[2])
+            return _rendered[known[2]]
+
+    with open(filepath, "r", encoding="utf-8") as f:
+        content = f.read()
+    html = render_markdown(content)
+    with _lock:
+        _files[filepath] = (stat.st_mtime_ns, stat.st_size, content_hash(content))
+    return html
@@ -0,0 +1,8 @@
+import os
+from web3 import Web3
+from dotenv import load_dotenv
+load_dotenv()
+
+# Sonic Network RPC URL
+SONIC_RPC_URL = os.getenv("SONIC_RPC_URL", "https://rpc.soniclabs.com")
+WEB3 = Web3(Web3.HTTPProvider(SONIC_RPC_URL))